@@ -1,72 +1,246 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from app.database import get_db, SessionLocal
 from app.models.user import User
 from app.models.product import Product
-from app.models.order import Order, OrderStatus
+from app.models.order import Order, OrderItem, OrderStatus
 from app.schemas.user import UserResponse
-from app.schemas.order import OrderResponse
-from app.core.deps import get_current_admin
-from typing import List
+from app.schemas.order import OrderResponse, OrderSummary
+from app.core.deps import get_current_admin, invalidate_principal
+from app.core.routing import SessionRoute
+from app.core.pagination import paginate
+from app.api.orders import page_orders
+from app.core.cache import catalog_cache, Snapshot
+from app.core.hashing import password_hasher
+from app.core.images import image_pipeline
+from app.core.outbox import outbox_worker
+from app.core.admission import concurrency_limiter, rate_limiter
+from app.core.slow_queries import slow_query_log
+from app.core.profiling import profile_store
+from app.core.streaming import streaming_export
+from app.config import settings
+from typing import List, Optional, Union
 
-router = APIRouter()
+router = APIRouter(route_class=SessionRoute)
 
 
-@router.get("/dashboard")
-def get_dashboard(
-    db: Session = Depends(get_db),
-    admin = Depends(get_current_admin)
-):
-    """Get admin dashboard statistics."""
-    total_users = db.query(func.count(User.id)).scalar()
-    total_products = db.query(func.count(Product.id)).scalar()
-    total_orders = db.query(func.count(Order.id)).scalar()
-    pending_orders = db.query(func.count(Order.id)).filter(
-        Order.status == OrderStatus.PENDING
-    ).scalar()
-    total_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.status.in_([OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED])
-    ).scalar() or 0
+REVENUE_STATUSES = {OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED}
+
+# Export layouts
+ORDER_EXPORT_COLUMNS = (
+    Order.id, Order.order_number, Order.user_id, User.email, Order.status, Order.total_amount,
+    Order.shipping_address, Order.payment_id, Order.created_at, Order.updated_at
+)
+ORDER_ITEM_EXPORT_COLUMNS = (
+    OrderItem.product_id, OrderItem.variant_id, OrderItem.quantity, OrderItem.price_at_purchase
+)
+USER_EXPORT_COLUMNS = (
+    User.id, User.email, User.full_name, User.phone, User.is_admin, User.is_active,
+    User.created_at, User.updated_at
+)
+
+
+def created_between(statement, column, created_from: Optional[datetime], created_to: Optional[datetime]):
+    """Limit `statement` to rows created in [created_from, created_to)."""
+    if created_from:
+        statement = statement.where(column >= created_from)
+    if created_to:
+        statement = statement.where(column < created_to)
+    return statement
+
+
+def compute_dashboard(db: Session) -> dict:
+    """Compute dashboard statistics with one grouped pass over orders."""
+    total_users, total_products = db.execute(select(
+        select(func.count(User.id)).scalar_subquery(),
+        select(func.count(Product.id)).scalar_subquery()
+    )).one()
+    
+    by_status = db.query(
+        Order.status, func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0)
+    ).group_by(Order.status).all()
     
     return {
         "total_users": total_users,
         "total_products": total_products,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "total_revenue": float(total_revenue)
+        "total_orders": sum(count for _, count, _ in by_status),
+        "pending_orders": sum(count for status, count, _ in by_status if status == OrderStatus.PENDING),
+        "total_revenue": float(sum(revenue for status, _, revenue in by_status if status in REVENUE_STATUSES)),
+        "orders_by_status": {status.value: count for status, count, _ in by_status},
+        "generated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def refresh_dashboard() -> dict:
+    db = SessionLocal()
+    try:
+        return compute_dashboard(db)
+    finally:
+        db.close()
+
+
+# Shared by all viewers, recomputed in the background once stale
+dashboard_snapshot = Snapshot(refresh_dashboard, ttl=settings.DASHBOARD_SNAPSHOT_TTL)
+
+
+@router.get("/dashboard")
+def get_dashboard(admin = Depends(get_current_admin)):
+    """Get admin dashboard statistics."""
+    return dashboard_snapshot.get()
+
+
+@router.get("/cache")
+def get_cache_stats(admin = Depends(get_current_admin)):
+    """Get catalog cache hit, miss and eviction statistics."""
+    return catalog_cache.stats()
+
+
+@router.get("/hashing")
+def get_hashing_stats(admin = Depends(get_current_admin)):
+    """Get password hashing pool load and latency statistics."""
+    return password_hasher.stats()
+
+
+@router.get("/images")
+def get_image_stats(admin = Depends(get_current_admin)):
+    """Get image derivative pipeline queue, render and disk cache statistics."""
+    return image_pipeline.stats()
+
+
+@router.get("/outbox")
+def get_outbox_stats(db: Session = Depends(get_db), admin = Depends(get_current_admin)):
+    """Get outbox backlog by status and worker throughput."""
+    return outbox_worker.stats(db)
+
+
+@router.get("/admission")
+def get_admission_stats(admin = Depends(get_current_admin)):
+    """Get rate limit and load shedding statistics."""
+    return {
+        "concurrency": concurrency_limiter.stats(),
+        "rate_limits": rate_limiter.stats() if rate_limiter is not None else None,
     }
 
 
-@router.get("/orders", response_model=List[OrderResponse])
+@router.get("/slow-queries")
+def get_slow_queries(admin = Depends(get_current_admin)):
+    """Get recent slow queries with their route, caller and sampled plan."""
+    if slow_query_log is None:
+        return {"enabled": False}
+    return {"enabled": True, **slow_query_log.stats()}
+
+
+@router.get("/profiles")
+def get_profiles(admin = Depends(get_current_admin)):
+    """List stored request profiles, newest first."""
+    return profile_store.recent()
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, admin = Depends(get_current_admin)):
+    """Download a request profile; open it at https://www.speedscope.app."""
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"profile-{profile_id}.speedscope.json")
+
+
+@router.get("/orders", response_model=List[Union[OrderResponse, OrderSummary]])
 def get_all_orders(
+    response: Response,
     db: Session = Depends(get_db),
     admin = Depends(get_current_admin),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    status: str = None
+    status: str = None,
+    cursor: Optional[str] = None,
+    summary: bool = False
 ):
-    """Get all orders (Admin only)."""
+    """
+    Get all orders (Admin only).
+    
+    Pass `cursor` to page by keyset; the next cursor is returned in the
+    X-Next-Cursor header. `summary=true` omits line items.
+    """
     query = db.query(Order)
     
     if status:
         query = query.filter(Order.status == status)
     
-    offset = (page - 1) * per_page
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(per_page).all()
-    return orders
+    return page_orders(query, response, per_page, page, cursor, summary)
+
+
+@router.get("/orders/export")
+def export_orders(
+    format: str = Query("csv", pattern="^(ndjson|csv)$"),
+    status: List[OrderStatus] = Query([]),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    items: bool = False,
+    admin = Depends(get_current_admin)
+):
+    """
+    Stream orders as CSV or NDJSON, oldest first (Admin only).
+    
+    Filter by one or more `status` values and a [created_from, created_to)
+    range. With `items=true` there is one row per line item, carrying the
+    order's columns. Rows come from a server-side cursor as they are
+    fetched, so the export size doesn't affect memory.
+    """
+    columns = ORDER_EXPORT_COLUMNS + (ORDER_ITEM_EXPORT_COLUMNS if items else ())
+    statement = select(*columns).join(User, User.id == Order.user_id)
+    if items:
+        statement = statement.join(OrderItem, OrderItem.order_id == Order.id)
+    if status:
+        statement = statement.where(Order.status.in_(status))
+    statement = created_between(statement, Order.created_at, created_from, created_to)
+    statement = statement.order_by(Order.created_at, Order.id)
+    
+    fields = [column.key for column in columns]
+    return streaming_export(statement, fields, format, "order-items" if items else "orders")
+
+
+@router.get("/users/export")
+def export_users(
+    format: str = Query("csv", pattern="^(ndjson|csv)$"),
+    active: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    admin = Depends(get_current_admin)
+):
+    """Stream users as CSV or NDJSON, oldest first, optionally filtered (Admin only)."""
+    statement = select(*USER_EXPORT_COLUMNS)
+    if active is not None:
+        statement = statement.where(User.is_active == active)
+    statement = created_between(statement, User.created_at, created_from, created_to)
+    statement = statement.order_by(User.created_at, User.id)
+    
+    fields = [column.key for column in USER_EXPORT_COLUMNS]
+    return streaming_export(statement, fields, format, "users")
 
 
 @router.get("/users", response_model=List[UserResponse])
 def get_all_users(
+    response: Response,
     db: Session = Depends(get_db),
     admin = Depends(get_current_admin),
     page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100)
+    per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
 ):
-    """Get all users (Admin only)."""
-    offset = (page - 1) * per_page
-    users = db.query(User).offset(offset).limit(per_page).all()
+    """
+    Get all users (Admin only).
+    
+    Pass `cursor` to page by keyset; the next cursor is returned in the
+    X-Next-Cursor header.
+    """
+    order = [(User.created_at, True), (User.id, True)]
+    users, next_cursor = paginate(db.query(User), order, per_page, page=page, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return users
 
 
@@ -83,4 +257,5 @@ def toggle_admin(
     
     user.is_admin = not user.is_admin
     db.commit()
+    invalidate_principal(user.id)
     return {"message": f"Admin status set to {user.is_admin}"}
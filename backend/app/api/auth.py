@@ -5,8 +5,9 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, Token, UserUpdate
-from app.core.security import verify_password, get_password_hash, create_access_token
-from app.core.deps import get_current_user
+from app.core.security import create_access_token
+from app.core.hashing import password_hasher
+from app.core.deps import get_current_user, invalidate_principal
 from app.config import settings
 
 router = APIRouter()
@@ -26,7 +27,7 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # Create new user
     user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=password_hasher.hash(user_data.password),
         full_name=user_data.full_name,
         phone=user_data.phone
     )
@@ -40,7 +41,7 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login and get JWT token."""
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not password_hasher.verify(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -76,5 +77,6 @@ def update_me(
         current_user.phone = user_data.phone
     
     db.commit()
+    invalidate_principal(current_user.id)
     db.refresh(current_user)
     return current_user
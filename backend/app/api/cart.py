@@ -1,28 +1,33 @@
+import uuid
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, exists, func, literal, or_, select
 from decimal import Decimal
 from app.database import get_db
-from app.models.cart import CartItem
-from app.models.product import Product
-from app.models.user import User
-from app.schemas.cart import CartItemCreate, CartItemUpdate, CartResponse
-from app.core.deps import get_current_user
+from app.models.cart import CartItem, CART_ITEM_KEY
+from app.models.product import Product, ProductVariant
+from app.schemas.user import Principal
+from app.schemas.cart import CartItemCreate, CartItemUpdate, CartBatch, CartResponse
+from app.core.deps import get_current_principal
+from app.core.routing import SessionRoute
+from app.core.upsert import upsert
+from app.core.variants import unit_price
 
-router = APIRouter()
+router = APIRouter(route_class=SessionRoute)
 
 
-@router.get("/", response_model=CartResponse)
-def get_cart(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get user's cart with items."""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
+def load_cart(db: Session, user_id) -> CartResponse:
+    """Load a user's cart with its products and variants in one query."""
+    cart_items = db.query(CartItem).options(
+        joinedload(CartItem.product), joinedload(CartItem.variant)
+    ).filter(
+        CartItem.user_id == user_id
+    ).all()
     
-    # Calculate total
+    # Calculate total (products are already loaded)
     total = Decimal("0")
     for item in cart_items:
-        total += item.product.price * item.quantity
+        total += unit_price(item.product, item.variant) * item.quantity
     
     return CartResponse(
         items=cart_items,
@@ -31,45 +36,158 @@ def get_cart(
     )
 
 
+def fold_operations(operations) -> dict:
+    """
+    Collapse batch operations into one change per (product, variant) line.
+    
+    Each change is ("add", delta) or ("set", quantity); a remove is a set
+    to 0, and an add after a set or remove adds to the set quantity.
+    Adds of less than 1 and negative sets are rejected with a 400.
+    """
+    changes = {}
+    for operation in operations:
+        key = (operation.product_id, operation.variant_id)
+        if operation.quantity < (1 if operation.op == "add" else 0):
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1 to add, or 0 to set")
+        if operation.op == "remove":
+            changes[key] = ("set", 0)
+        elif operation.op == "set":
+            changes[key] = ("set", operation.quantity)
+        else:
+            kind, quantity = changes.get(key, ("add", 0))
+            changes[key] = (kind, quantity + operation.quantity)
+    return changes
+
+
+@router.get("/", response_model=CartResponse)
+def get_cart(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Get user's cart with items."""
+    return load_cart(db, current_user.id)
+
+
 @router.post("/items")
 def add_to_cart(
     item_data: CartItemCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Add item to cart."""
-    # Check product exists
-    product = db.query(Product).filter(Product.id == item_data.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Check if already in cart
-    existing_item = db.query(CartItem).filter(
-        CartItem.user_id == current_user.id,
-        CartItem.product_id == item_data.product_id,
-        CartItem.variant_id == item_data.variant_id
-    ).first()
+    """Add item to cart, or add to the quantity of a line already in it."""
+    # Insert straight from the product row, so a missing or inactive
+    # product (or a variant of another product) inserts nothing
+    source = and_(Product.id == item_data.product_id, Product.is_active == True)
+    if item_data.variant_id is not None:
+        source = and_(source, exists().where(
+            ProductVariant.id == item_data.variant_id,
+            ProductVariant.product_id == Product.id,
+            ProductVariant.is_active == True
+        ))
+    statement = upsert(db, CartItem)
+    statement = statement.from_select(
+        ["id", "user_id", "product_id", "variant_id", "quantity"],
+        select(
+            literal(uuid.uuid4(), CartItem.id.type),
+            literal(current_user.id, CartItem.user_id.type),
+            Product.id,
+            literal(item_data.variant_id, CartItem.variant_id.type),
+            literal(item_data.quantity, CartItem.quantity.type)
+        ).where(source)
+    ).on_conflict_do_update(
+        index_elements=CART_ITEM_KEY,
+        set_={"quantity": CartItem.quantity + statement.excluded.quantity, "updated_at": func.now()}
+    )
     
-    if existing_item:
-        existing_item.quantity += item_data.quantity
-    else:
-        cart_item = CartItem(
-            user_id=current_user.id,
-            product_id=item_data.product_id,
-            variant_id=item_data.variant_id,
-            quantity=item_data.quantity
-        )
-        db.add(cart_item)
+    if db.execute(statement.returning(CartItem.id)).first() is None:
+        raise HTTPException(status_code=404, detail="Product or variant not found")
     
     db.commit()
     return {"message": "Item added to cart"}
 
 
+@router.post("/items/batch", response_model=CartResponse)
+def batch_update_cart(
+    batch: CartBatch,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply many cart changes in one transaction and return the cart.
+    
+    Operations address lines by product and variant: `add` adds to the
+    quantity, `set` replaces it and `remove` (or `set` to 0) drops the
+    line. Later operations on the same line build on earlier ones.
+    """
+    changes = fold_operations(batch.operations)
+    
+    lines = {key for key, (kind, quantity) in changes.items() if kind == "add" or quantity > 0}
+    wanted = {product_id for product_id, _ in lines}
+    found = set(db.scalars(select(Product.id).where(Product.id.in_(wanted), Product.is_active == True))) if wanted else set()
+    if wanted - found:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Product not found", "product_ids": sorted(str(pid) for pid in wanted - found)}
+        )
+    
+    variant_lines = {(product_id, variant_id) for product_id, variant_id in lines if variant_id is not None}
+    if variant_lines:
+        found_variants = set(db.execute(
+            select(ProductVariant.product_id, ProductVariant.id).where(
+                ProductVariant.id.in_({variant_id for _, variant_id in variant_lines}),
+                ProductVariant.is_active == True
+            )
+        ).tuples())
+        if variant_lines - found_variants:
+            raise HTTPException(
+                status_code=404,
+                detail={
+                    "message": "Variant not found",
+                    "variant_ids": sorted(str(vid) for _, vid in variant_lines - found_variants)
+                }
+            )
+    
+    removed = [key for key, (kind, quantity) in changes.items() if kind == "set" and quantity <= 0]
+    if removed:
+        db.query(CartItem).filter(
+            CartItem.user_id == current_user.id,
+            or_(*(
+                and_(
+                    CartItem.product_id == product_id,
+                    CartItem.variant_id == variant_id if variant_id is not None else CartItem.variant_id.is_(None)
+                )
+                for product_id, variant_id in removed
+            ))
+        ).delete(synchronize_session=False)
+    
+    statement = upsert(db, CartItem)
+    for kind, quantity in (("add", CartItem.quantity + statement.excluded.quantity), ("set", statement.excluded.quantity)):
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": current_user.id,
+                "product_id": product_id,
+                "variant_id": variant_id,
+                "quantity": value
+            }
+            for (product_id, variant_id), (change, value) in changes.items()
+            if change == kind and (kind == "add" or value > 0)
+        ]
+        if rows:
+            db.execute(statement.on_conflict_do_update(
+                index_elements=CART_ITEM_KEY,
+                set_={"quantity": quantity, "updated_at": func.now()}
+            ), rows)
+    
+    db.commit()
+    return load_cart(db, current_user.id)
+
+
 @router.put("/items/{item_id}")
 def update_cart_item(
     item_id: str,
     item_data: CartItemUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Update cart item quantity."""
@@ -93,7 +211,7 @@ def update_cart_item(
 @router.delete("/items/{item_id}")
 def remove_from_cart(
     item_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Remove item from cart."""
@@ -112,7 +230,7 @@ def remove_from_cart(
 
 @router.delete("/clear")
 def clear_cart(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Clear entire cart."""
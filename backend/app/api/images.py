@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, RedirectResponse
+from app.core.images import DERIVATIVE_NAME, image_pipeline
+
+router = APIRouter()
+
+
+@router.get("/{name}")
+def get_image(name: str):
+    """
+    Serve a resized product image from the derivative cache.
+    
+    Names are content hashes, so hits can be cached forever. An evicted
+    derivative redirects to its original while it is rendered again.
+    """
+    match = DERIVATIVE_NAME.match(name)
+    if match is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    path = image_pipeline.derivative_path(name)
+    if path is not None:
+        return FileResponse(
+            path,
+            media_type=f"image/{match['format']}",
+            headers={"Cache-Control": "public, max-age=31536000, immutable"}
+        )
+    
+    source = image_pipeline.source_url(match["digest"])
+    if source is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return RedirectResponse(source, status_code=307)
@@ -1,16 +1,22 @@
 import uuid
-from typing import List
+from typing import List, Optional, Union
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import insert
 from app.database import get_db
 from app.models.order import Order, OrderItem, OrderStatus
 from app.models.cart import CartItem
-from app.models.user import User
-from app.schemas.order import OrderCreate, OrderResponse, OrderStatusUpdate
-from app.core.deps import get_current_user, get_current_admin
+from app.schemas.user import Principal
+from app.schemas.order import OrderCreate, OrderSummary, OrderResponse, OrderStatusUpdate
+from app.core.deps import get_current_principal, get_current_admin
+from app.core.routing import SessionRoute
+from app.core.pagination import paginate
+from app.core.inventory import reserve_stock, change_order_status, forget_cached_stock
+from app.core.outbox import enqueue, outbox_worker
+from app.core.variants import unit_price
 
-router = APIRouter()
+router = APIRouter(route_class=SessionRoute)
 
 
 def generate_order_number():
@@ -18,22 +24,55 @@ def generate_order_number():
     return f"ORD-{uuid.uuid4().hex[:8].upper()}"
 
 
-@router.get("/", response_model=List[OrderResponse])
+def page_orders(query, response: Response, per_page: Optional[int], page: int, cursor: Optional[str], summary: bool):
+    """
+    Fetch a page of orders, newest first; every order when `per_page` is None.
+    
+    Items for the whole page are loaded in one batched query, or skipped
+    in summary mode. The next cursor goes in the X-Next-Cursor header.
+    """
+    if not summary:
+        query = query.options(selectinload(Order.items))
+    
+    order = [(Order.created_at, True), (Order.id, True)]
+    if per_page is None:
+        orders = query.order_by(*(column.desc() for column, _ in order)).all()
+    else:
+        orders, next_cursor = paginate(query, order, per_page, page=page, cursor=cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    
+    schema = OrderSummary if summary else OrderResponse
+    return [schema.model_validate(order) for order in orders]
+
+
+@router.get("/", response_model=List[Union[OrderResponse, OrderSummary]])
 def get_orders(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+    page: Optional[int] = Query(None, ge=1),
+    per_page: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    summary: bool = False
 ):
-    """Get user's order history."""
-    orders = db.query(Order).filter(
-        Order.user_id == current_user.id
-    ).order_by(Order.created_at.desc()).all()
-    return orders
+    """
+    Get user's order history.
+    
+    Without paging parameters every order is returned. Pass `page`/`per_page`
+    (20 per page by default) to page by offset, or `cursor` to page by
+    keyset; `summary=true` returns order headers without line items.
+    """
+    query = db.query(Order).filter(Order.user_id == current_user.id)
+    if page is None and per_page is None and cursor is None:
+        return page_orders(query, response, None, 1, None, summary)
+    return page_orders(query, response, per_page or 20, page or 1, cursor, summary)
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
 def get_order(
     order_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get single order details."""
@@ -50,12 +89,14 @@ def get_order(
 @router.post("/checkout", response_model=OrderResponse)
 def checkout(
     order_data: OrderCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Create order from cart."""
-    # Get cart items
-    cart_items = db.query(CartItem).filter(
+    # Get cart items with their products and variants in one query
+    cart_items = db.query(CartItem).options(
+        joinedload(CartItem.product), joinedload(CartItem.variant)
+    ).filter(
         CartItem.user_id == current_user.id
     ).all()
     
@@ -65,7 +106,7 @@ def checkout(
     # Calculate total
     total = Decimal("0")
     for item in cart_items:
-        total += item.product.price * item.quantity
+        total += unit_price(item.product, item.variant) * item.quantity
     
     # Create order
     order = Order(
@@ -78,21 +119,30 @@ def checkout(
     db.add(order)
     db.flush()
     
-    # Create order items
-    for cart_item in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            variant_id=cart_item.variant_id,
-            quantity=cart_item.quantity,
-            price_at_purchase=cart_item.product.price
-        )
-        db.add(order_item)
+    # Reserve stock; a 409 here leaves the transaction uncommitted
+    reserve_stock(db, order.id, [(item.product, item.variant, item.quantity) for item in cart_items])
+    
+    # Create order items in one bulk INSERT
+    db.execute(insert(OrderItem), [
+        {
+            "order_id": order.id,
+            "product_id": cart_item.product_id,
+            "variant_id": cart_item.variant_id,
+            "quantity": cart_item.quantity,
+            "price_at_purchase": unit_price(cart_item.product, cart_item.variant)
+        }
+        for cart_item in cart_items
+    ])
     
     # Clear cart
     db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
     
+    # Payment and confirmation run on the outbox worker once this commits
+    enqueue(db, "order.created", {"order_id": str(order.id)})
+    
     db.commit()
+    outbox_worker.notify()
+    forget_cached_stock(db, {item.product_id for item in cart_items})
     db.refresh(order)
     return order
 
@@ -109,7 +159,8 @@ def update_order_status(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    order.status = status_data.status
+    restocked = change_order_status(db, order, status_data.status)
     db.commit()
+    forget_cached_stock(db, restocked)
     db.refresh(order)
     return order
@@ -0,0 +1,41 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.core.outbox import enqueue, outbox_worker
+from app.core.payments import PaymentNotConfigured, payment_provider
+
+router = APIRouter()
+
+
+def record_event(event: dict) -> None:
+    db = SessionLocal()
+    try:
+        # Providers redeliver events; the key keeps one copy of each
+        enqueue(db, "payment.event", event, key=f"{payment_provider.name}:{event['id']}")
+        db.commit()
+    finally:
+        db.close()
+
+
+@router.post("/webhook")
+async def payment_webhook(request: Request, stripe_signature: Optional[str] = Header(None)):
+    """
+    Receive a payment provider webhook.
+    
+    The signature is checked and the event stored for the outbox worker,
+    which updates the order, so the provider gets its ack straight away.
+    """
+    payload = await request.body()
+    try:
+        event = payment_provider.parse_event(payload, stripe_signature)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook signature or payload")
+    except PaymentNotConfigured:
+        raise HTTPException(status_code=503, detail="Payment webhooks are not configured")
+    if not isinstance(event, dict) or "id" not in event:
+        raise HTTPException(status_code=400, detail="Invalid webhook signature or payload")
+    
+    await run_in_threadpool(record_event, event)
+    outbox_worker.notify()
+    return {"received": True}
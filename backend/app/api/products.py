@@ -1,69 +1,288 @@
+import io
+from decimal import Decimal
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import and_, func, literal, null, or_, select, union_all
 from app.database import get_db
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductList
+from app.models.product import Product, ProductVariant
+from app.schemas.product import (
+    ProductCreate, ProductUpdate, ProductResponse, ProductVariantResponse, ProductList, ProductFacets
+)
 from app.core.deps import get_current_admin
+from app.core.routing import SessionRoute
+from app.core.search import apply_search
+from app.core.pagination import paginate, estimate_count
+from app.core.cache import catalog_cache
+from app.core.serialization import dumps
+from app.core.conditional import cached_response, etag_for, http_timestamp
+from app.core.text import tokenize
+from app.core.inventory import set_stock_shards
+from app.core.product_import import EXPORT_FIELDS, attach_variants, export_statement, import_products
+from app.core.streaming import streaming_export
+from app.core.variants import replace_variants, variant_fields
+from app.core.images import image_pipeline
 
-router = APIRouter()
+router = APIRouter(route_class=SessionRoute)
+
+RESPONSE_FIELDS = tuple(ProductResponse.model_fields)
+VARIANT_FIELDS = tuple(ProductVariantResponse.model_fields)
+FACET_KEYS = {"category": "categories", "brand": "brands"}
+
+
+def filter_products(
+    db: Session,
+    category: Optional[str],
+    brand: Optional[str],
+    search: Optional[str],
+    min_price: Optional[Decimal],
+    max_price: Optional[Decimal],
+    shade: Optional[str] = None,
+    size: Optional[str] = None
+):
+    """Build the active-product query for a filter set; returns (query, relevance order or None)."""
+    query = db.query(Product).filter(Product.is_active == True)
+    
+    if category:
+        query = query.filter(Product.category == category)
+    if brand:
+        query = query.filter(Product.brand == brand)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    
+    # Variant attributes: EXISTS on the (type, value, product_id) index
+    for variant_type, value in (("shade", shade), ("size", size)):
+        if value:
+            query = query.filter(Product.variants.any(and_(
+                ProductVariant.type == variant_type,
+                ProductVariant.value == value.strip().lower(),
+                ProductVariant.is_active == True
+            )))
+    
+    relevance = None
+    if search:
+        query, relevance = apply_search(query, search)
+    return query, relevance
+
+
+def count_products(query, category: Optional[str], filters: tuple, mode: str) -> Optional[int]:
+    """Get the total for a filtered product query, served from the catalog cache."""
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        return estimate_count(query)
+    
+    key = catalog_cache.listing_key("count", category, *filters)
+    total = catalog_cache.get(key)
+    if total is None:
+        total = query.count()
+        catalog_cache.set(key, total)
+    return total
+
+
+def product_entry(product: Product) -> list:
+    """
+    Serialize a product and cache it under its id and slug.
+    
+    The row comes from our own table, so it is dumped straight to JSON
+    without ProductResponse validation. The entry is [json, etag,
+    modified]; listing pages reuse its json until a write to the product
+    drops it.
+    """
+    entry = catalog_cache.get(f"product:{product.id}")
+    if entry is None:
+        data = dumps({
+            field: [
+                {key: getattr(variant, key) for key in VARIANT_FIELDS} for variant in product.variants
+            ] if field == "variants" else getattr(product, field)
+            for field in RESPONSE_FIELDS
+        }).decode()
+        entry = [data, etag_for(data), http_timestamp(product.updated_at or product.created_at)]
+        catalog_cache.set(f"product:{product.id}", entry)
+        catalog_cache.set(f"product:{product.slug}", entry)
+    return entry
+
+
+def listing_entry(products: List[Product], **fields) -> list:
+    """
+    Build a ProductList [json, etag, modified] entry from product entries.
+    
+    Listings have no Last-Modified: deleting, deactivating or re-sorting
+    a product changes a page without moving any updated_at on it, so only
+    the ETag can tell a client its copy is stale.
+    """
+    entries = [product_entry(product) for product in products]
+    body = '{"items":[' + ",".join(entry[0] for entry in entries) + "]," + dumps(fields).decode()[1:]
+    return [body, etag_for(body), None]
 
 
 @router.get("/", response_model=ProductList)
 def get_products(
+    request: Request,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(12, ge=1, le=100),
     category: Optional[str] = None,
+    brand: Optional[str] = None,
     search: Optional[str] = None,
-    sort: Optional[str] = "created_at"
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    shade: Optional[str] = None,
+    size: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|estimate|none)$")
 ):
-    """Get all products with pagination and filtering."""
-    query = db.query(Product).filter(Product.is_active == True)
+    """
+    Get all products with pagination and filtering.
     
-    # Category filter
-    if category:
-        query = query.filter(Product.category == category)
+    Pass `cursor` (empty for the first page) to page by keyset instead of
+    `page`; follow `next_cursor` from each response to continue.
     
-    # Search filter
-    if search:
-        query = query.filter(
-            or_(
-                Product.title_en.ilike(f"%{search}%"),
-                Product.title_ar.ilike(f"%{search}%"),
-                Product.description_en.ilike(f"%{search}%")
-            )
-        )
+    `count` selects how `total` is computed: "exact" (cached per filter
+    set), "estimate" (planner estimate) or "none" (use `has_more`).
     
-    # Sorting
-    if sort == "price_asc":
-        query = query.order_by(Product.price.asc())
-    elif sort == "price_desc":
-        query = query.order_by(Product.price.desc())
-    else:
-        query = query.order_by(Product.created_at.desc())
+    Pages carry an ETag; a matching revalidation of a cached page is
+    answered with 304 before any query runs.
+    """
+    filters = (brand, tuple(tokenize(search)), min_price, max_price, shade, size)
+    cache_key = catalog_cache.listing_key("list", category, *filters, sort, page, per_page, cursor, count)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(request, cached)
+    
+    query, relevance = filter_products(db, category, brand, search, min_price, max_price, shade, size)
     
     # Count total
-    total = query.count()
+    total = count_products(query, category, filters, count)
+    
+    # Sorting (relevance by default when searching)
+    if relevance is not None and sort in (None, "relevance"):
+        if cursor is not None:
+            raise HTTPException(status_code=400, detail="Cursor pagination is not available for relevance sort")
+        query = query.order_by(relevance, Product.created_at.desc())
+        products = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        entry = listing_entry(
+            products[:per_page],
+            total=total,
+            has_more=len(products) > per_page,
+            page=page,
+            per_page=per_page,
+            next_cursor=None
+        )
+    else:
+        if sort == "price_asc":
+            order = [(Product.price, False), (Product.id, False)]
+        elif sort == "price_desc":
+            order = [(Product.price, True), (Product.id, True)]
+        else:
+            order = [(Product.created_at, True), (Product.id, True)]
     
-    # Paginate
-    offset = (page - 1) * per_page
-    products = query.offset(offset).limit(per_page).all()
+        # Paginate
+        products, next_cursor = paginate(query, order, per_page, page=page, cursor=cursor)
+        entry = listing_entry(
+            products,
+            total=total,
+            has_more=next_cursor is not None,
+            page=page if cursor is None else None,
+            per_page=per_page,
+            next_cursor=next_cursor
+        )
     
-    return ProductList(items=products, total=total, page=page, per_page=per_page)
+    catalog_cache.set(cache_key, entry)
+    return cached_response(request, entry)
+
+
+@router.get("/facets", response_model=ProductFacets)
+def get_facets(
+    db: Session = Depends(get_db),
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    search: Optional[str] = None,
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    shade: Optional[str] = None,
+    size: Optional[str] = None
+):
+    """
+    Get category and brand counts and the price range for a filter set.
+    
+    Takes the same filters as the product listing. All facets come from
+    one statement over the filtered rows, cached per filter combination.
+    """
+    filters = (brand, tuple(tokenize(search)), min_price, max_price, shade, size)
+    cache_key = catalog_cache.listing_key("facets", category, *filters)
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    query, _ = filter_products(db, category, brand, search, min_price, max_price, shade, size)
+    filtered = query.with_entities(Product.category, Product.brand, Product.price).cte("filtered")
+    
+    # The price row goes first so the union's min/max columns keep the price type
+    rows = db.execute(union_all(
+        select(literal("price"), null(), func.count(), func.min(filtered.c.price), func.max(filtered.c.price)),
+        select(literal("category"), filtered.c.category, func.count(), null(), null()).group_by(filtered.c.category),
+        select(literal("brand"), filtered.c.brand, func.count(), null(), null()).group_by(filtered.c.brand)
+    )).all()
+    
+    facets = {"total": 0, "categories": [], "brands": [], "price": {"min": None, "max": None}}
+    for facet, value, count, low, high in rows:
+        if facet == "price":
+            facets["total"] = count
+            facets["price"] = {"min": low, "max": high}
+        else:
+            facets[FACET_KEYS[facet]].append({"value": value, "count": count})
+    for facet in FACET_KEYS.values():
+        facets[facet].sort(key=lambda item: (-item["count"], item["value"] or ""))
+    
+    data = ProductFacets.model_validate(facets).model_dump(mode="json")
+    catalog_cache.set(cache_key, data)
+    return data
+
+
+@router.get("/export")
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    admin = Depends(get_current_admin)
+):
+    """Stream the whole catalog as NDJSON or CSV (Admin only); the format re-imports as is."""
+    return streaming_export(export_statement(), EXPORT_FIELDS, format, "products", attach_variants)
+
+
+@router.post("/import")
+def import_products_file(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    db: Session = Depends(get_db),
+    admin = Depends(get_current_admin)
+):
+    """
+    Upsert products by slug from an NDJSON or CSV upload (Admin only).
+    
+    Rows are written in chunks; invalid rows are skipped and listed in
+    `errors` with their line number.
+    """
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return import_products(db, lines, format).as_dict()
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: str, db: Session = Depends(get_db)):
-    """Get a single product by ID or slug."""
+def get_product(product_id: str, request: Request, db: Session = Depends(get_db)):
+    """Get a single product by ID or slug (conditional GETs are answered from cache)."""
+    cached = catalog_cache.get(f"product:{product_id}")
+    if cached is not None:
+        return cached_response(request, cached)
+    
     product = db.query(Product).filter(
         or_(Product.id == product_id, Product.slug == product_id)
     ).first()
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return cached_response(request, product_entry(product))
 
 
 @router.post("/", response_model=ProductResponse)
@@ -78,9 +297,15 @@ def create_product(
     if existing:
         raise HTTPException(status_code=400, detail="Slug already exists")
     
-    product = Product(**product_data.model_dump())
+    data = product_data.model_dump()
+    variants = data.pop("variants")
+    product = Product(**data)
     db.add(product)
+    db.flush()
+    replace_variants(db, {product.id: variants})
     db.commit()
+    catalog_cache.invalidate_product(product.id, product.slug, product.category)
+    image_pipeline.submit(product.id)
     db.refresh(product)
     return product
 
@@ -97,11 +322,48 @@ def update_product(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    previous_category = product.category
     update_data = product_data.model_dump(exclude_unset=True)
+    update_data.pop("variants", None)
+    if product_data.variants is not None:
+        replace_variants(db, {product.id: [variant_fields(variant) for variant in product_data.variants]})
+    shards = product.stock_shards if "stock_quantity" in update_data else 0
+    if shards:
+        # Fold the shards back so the new stock is spread over them afresh
+        set_stock_shards(db, product, 0)
     for key, value in update_data.items():
         setattr(product, key, value)
+    if shards:
+        set_stock_shards(db, product, shards)
+    
+    db.commit()
+    catalog_cache.invalidate_product(product.id, product.slug, previous_category, product.category)
+    if "images" in update_data:
+        image_pipeline.submit(product.id)
+    db.refresh(product)
+    return product
+
+
+@router.put("/{product_id}/stock-shards", response_model=ProductResponse)
+def update_stock_shards(
+    product_id: str,
+    count: int = Query(..., ge=0, le=64),
+    db: Session = Depends(get_db),
+    admin = Depends(get_current_admin)
+):
+    """
+    Split a hot product's stock over `count` shard rows (Admin only).
+    
+    Checkouts then take stock from a random shard instead of all locking
+    the product row. `count=0` folds the shards back into the product.
+    """
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
     
+    set_stock_shards(db, product, count)
     db.commit()
+    catalog_cache.delete(f"product:{product.id}", f"product:{product.slug}")
     db.refresh(product)
     return product
 
@@ -117,6 +379,8 @@ def delete_product(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    product_key = (product.id, product.slug, product.category)
     db.delete(product)
     db.commit()
+    catalog_cache.invalidate_product(*product_key)
     return {"message": "Product deleted"}
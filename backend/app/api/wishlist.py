@@ -1,71 +1,147 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
 from app.database import get_db
 from app.models.wishlist import Wishlist
 from app.models.product import Product
-from app.models.user import User
+from app.schemas.user import Principal
 from app.schemas.product import ProductResponse
-from app.core.deps import get_current_user
-from typing import List
+from app.schemas.wishlist import WishlistBulk, WishlistMembership
+from app.core.deps import get_current_principal
+from app.core.routing import SessionRoute
+from app.core.pagination import paginate
+from app.core.upsert import upsert
+from typing import List, Optional
+from uuid import UUID
 
-router = APIRouter()
+router = APIRouter(route_class=SessionRoute)
+
+
+def add_products(db: Session, user_id, product_ids) -> tuple:
+    """
+    Add existing products to a wishlist, skipping ones already in it.
+    
+    Returns (added, missing) sets of product ids.
+    """
+    product_ids = set(product_ids)
+    found = set(db.scalars(select(Product.id).where(Product.id.in_(product_ids)))) if product_ids else set()
+    if not found:
+        return set(), product_ids
+    
+    statement = upsert(db, Wishlist).on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+    added = db.scalars(
+        statement.returning(Wishlist.product_id),
+        [{"id": uuid.uuid4(), "user_id": user_id, "product_id": product_id} for product_id in found]
+    ).all()
+    return set(added), product_ids - found
 
 
 @router.get("/", response_model=List[ProductResponse])
 def get_wishlist(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+    page: Optional[int] = Query(None, ge=1),
+    per_page: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None
 ):
-    """Get user's wishlist products."""
-    wishlist_items = db.query(Wishlist).filter(
+    """
+    Get user's wishlist products, most recently added first.
+    
+    Without paging parameters the whole wishlist is returned.
+    Pass `page`/`per_page` (50 per page by default) to page by offset, or
+    `cursor` to page by keyset; the next cursor is returned in the
+    X-Next-Cursor header. Products are loaded with the rows in one query.
+    """
+    query = db.query(Wishlist).options(joinedload(Wishlist.product)).filter(
         Wishlist.user_id == current_user.id
-    ).all()
+    )
+    order = [(Wishlist.created_at, True), (Wishlist.id, True)]
+    if page is None and per_page is None and cursor is None:
+        wishlist_items = query.order_by(*(column.desc() for column, _ in order)).all()
+    else:
+        wishlist_items, next_cursor = paginate(query, order, per_page or 50, page=page or 1, cursor=cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
     
     return [item.product for item in wishlist_items]
 
 
+@router.get("/contains", response_model=WishlistMembership)
+def wishlist_contains(
+    product_ids: List[UUID] = Query(..., max_length=200),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Tell which of the given products are in the user's wishlist (one indexed lookup)."""
+    found = db.scalars(select(Wishlist.product_id).where(
+        Wishlist.user_id == current_user.id,
+        Wishlist.product_id.in_(product_ids)
+    )).all()
+    return WishlistMembership(product_ids=found)
+
+
+@router.post("/bulk")
+def bulk_update_wishlist(
+    changes: WishlistBulk,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Add and remove many products in one transaction.
+    
+    Products already in the wishlist are skipped and unknown products are
+    reported in `missing` rather than failing the request.
+    """
+    removed = 0
+    if changes.remove:
+        removed = db.query(Wishlist).filter(
+            Wishlist.user_id == current_user.id,
+            Wishlist.product_id.in_(changes.remove)
+        ).delete(synchronize_session=False)
+    
+    added, missing = add_products(db, current_user.id, changes.add)
+    db.commit()
+    return {
+        "added": len(added),
+        "removed": removed,
+        "missing": sorted(str(product_id) for product_id in missing)
+    }
+
+
 @router.post("/{product_id}")
 def add_to_wishlist(
-    product_id: str,
-    current_user: User = Depends(get_current_user),
+    product_id: UUID,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Add product to wishlist."""
-    # Check product exists
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    added, missing = add_products(db, current_user.id, [product_id])
+    if missing:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Check if already in wishlist
-    existing = db.query(Wishlist).filter(
-        Wishlist.user_id == current_user.id,
-        Wishlist.product_id == product_id
-    ).first()
-    
-    if existing:
+    if not added:
         return {"message": "Product already in wishlist"}
     
-    wishlist_item = Wishlist(user_id=current_user.id, product_id=product_id)
-    db.add(wishlist_item)
     db.commit()
     return {"message": "Added to wishlist"}
 
 
 @router.delete("/{product_id}")
 def remove_from_wishlist(
-    product_id: str,
-    current_user: User = Depends(get_current_user),
+    product_id: UUID,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Remove product from wishlist."""
-    wishlist_item = db.query(Wishlist).filter(
+    removed = db.query(Wishlist).filter(
         Wishlist.user_id == current_user.id,
         Wishlist.product_id == product_id
-    ).first()
+    ).delete(synchronize_session=False)
     
-    if not wishlist_item:
+    if not removed:
         raise HTTPException(status_code=404, detail="Item not in wishlist")
     
-    db.delete(wishlist_item)
     db.commit()
     return {"message": "Removed from wishlist"}
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from app.config import settings
+from app.core.deps import decode_token_cached
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Paths neither rate limited nor counted against the concurrency limit
+EXEMPT_PATHS = ("/", "/health", "/metrics")
+# Providers retry failed deliveries from a handful of IPs, so webhooks skip the buckets
+UNLIMITED_PREFIXES = ("/api/payments/webhook",)
+CATALOG_PREFIXES = ("/api/products", "/api/images", settings.MEDIA_URL.rstrip("/"))
+
+
+def parse_rate(rate: str) -> tuple:
+    """Parse "10/minute" into (capacity, tokens refilled per second)."""
+    count, _, period = rate.partition("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().lower()]
+
+
+class LocalBuckets:
+    """In-process token buckets, bounded to the `maxsize` most recently seen clients."""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take a token; returns 0 if one was available, else seconds until one is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # A forgotten client starts again with a full bucket
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+    
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RedisBuckets:
+    """Token buckets shared by all workers on Redis (requires the `redis` package)."""
+    
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+    redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate * 1000))
+    return tostring(wait)
+    """
+    
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+    
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        return float(self.script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()]))
+
+
+class RateLimiter:
+    """
+    Per-client token buckets with a budget per route group.
+    
+    Buckets live in-process unless a shared backend is given; if the
+    backend fails, the local buckets take over rather than failing
+    requests.
+    """
+    
+    def __init__(self, limits: dict, max_clients: int, backend=None):
+        self.limits = {name: parse_rate(rate) for name, rate in limits.items()}
+        self.local = LocalBuckets(max_clients)
+        self.backend = backend
+        self.allowed = {name: 0 for name in self.limits}
+        self.limited = {name: 0 for name in self.limits}
+        self.backend_errors = 0
+    
+    def rule(self, method: str, path: str, query_string: bytes) -> Optional[str]:
+        """Name of the budget a request draws from, or None if it is unlimited."""
+        if path in EXEMPT_PATHS or path.startswith(UNLIMITED_PREFIXES):
+            return None
+        if method == "POST" and path == "/api/auth/login":
+            return "login"
+        if method == "POST" and path == "/api/auth/register":
+            return "register"
+        if method == "GET" and path.startswith(CATALOG_PREFIXES):
+            if b"search=" in query_string and parse_qs(query_string.decode("latin-1")).get("search"):
+                return "search"
+            return "catalog"
+        return "default"
+    
+    def take(self, rule: str, key: str) -> float:
+        capacity, rate = self.limits[rule]
+        bucket = f"{rule}:{key}"
+        wait = None
+        if self.backend is not None:
+            try:
+                wait = self.backend.take(bucket, capacity, rate)
+            except Exception:
+                self.backend_errors += 1
+                logger.warning("Shared rate limit backend failed, using local buckets", exc_info=True)
+        if wait is None:
+            wait = self.local.take(bucket, capacity, rate)
+        if wait:
+            self.limited[rule] += 1
+        else:
+            self.allowed[rule] += 1
+        return wait
+    
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "local_clients": len(self.local),
+            "backend_errors": self.backend_errors,
+            "rules": {
+                name: {"rate": settings.RATE_LIMITS[name], "allowed": self.allowed[name], "limited": self.limited[name]}
+                for name in self.limits
+            },
+        }
+
+
+def client_key(scope, headers: Headers, rule: str) -> str:
+    """Signed-in users are limited per user, everyone else (and all logins) per IP."""
+    if rule not in ("login", "register"):
+        authorization = headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            try:
+                return f"user:{decode_token_cached(authorization[7:])}"
+            except HTTPException:
+                pass
+    if settings.RATE_LIMIT_TRUST_FORWARDED and "x-forwarded-for" in headers:
+        return "ip:" + headers["x-forwarded-for"].split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def reject(send, status_code: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class ConcurrencyLimiter:
+    """At most `max_concurrent` requests in flight; others wait up to `queue_timeout` for a slot."""
+    
+    def __init__(self, max_concurrent: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.shed = 0
+        self._slots = None
+    
+    async def acquire(self) -> bool:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        if self._slots.locked():
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        return True
+    
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_timeout": self.queue_timeout,
+            "shed": self.shed,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Turn away excess load before it reaches the database.
+    
+    Each client first takes a token from the bucket of its route group,
+    or gets a 429 with Retry-After. Admitted requests then need a
+    concurrency slot; a request that can't get one quickly gets a 503
+    instead of queueing behind an exhausted connection pool.
+    """
+    
+    def __init__(self, app, limiter: Optional[RateLimiter], concurrency: ConcurrencyLimiter):
+        self.app = app
+        self.limiter = limiter
+        self.concurrency = concurrency
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+    
+        if self.limiter is not None:
+            rule = self.limiter.rule(scope["method"], scope["path"], scope["query_string"])
+            if rule is not None:
+                key = client_key(scope, Headers(scope=scope), rule)
+                if self.limiter.backend is None:
+                    wait = self.limiter.take(rule, key)
+                else:
+                    wait = await run_in_threadpool(self.limiter.take, rule, key)
+                if wait:
+                    await reject(send, 429, "Too many requests", wait)
+                    return
+    
+        if not await self.concurrency.acquire():
+            await reject(send, 503, "Server busy, please retry", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency.release()
+
+
+concurrency_limiter = ConcurrencyLimiter(
+    max_concurrent=settings.MAX_CONCURRENT_REQUESTS,
+    queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT
+)
+
+rate_limiter = RateLimiter(
+    limits=settings.RATE_LIMITS,
+    max_clients=settings.RATE_LIMIT_MAX_CLIENTS,
+    backend=RedisBuckets(settings.RATE_LIMIT_URL) if settings.RATE_LIMIT_URL else None
+) if settings.RATE_LIMIT_ENABLED else None
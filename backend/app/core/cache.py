@@ -0,0 +1,268 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from app.config import settings
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after `ttl` seconds."""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend:
+    """Interface for a cache store shared between workers."""
+    
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+    
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+    
+    def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+    
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class LocalBackend(CacheBackend):
+    """In-process stand-in for a shared backend, for tests and single-worker runs."""
+    
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+    
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+    
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._data.get(key, (b"0", None))[0]) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+
+class RedisBackend(CacheBackend):
+    """Shared backend on Redis (requires the `redis` package)."""
+    
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+    
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(key, value, px=int(ttl * 1000))
+    
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+    
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+
+class CatalogCache:
+    """
+    Two-tier cache for serialized catalog reads.
+    
+    Entries live in a bounded in-process LRU and, when configured, in a
+    shared backend so every worker sees the same data. Listing keys carry
+    a per-category generation that product writes bump, which retires
+    every cached listing page and count the write could have changed.
+    Product entries are deleted directly; other workers' local copies
+    expire within `local_ttl`.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float, local_ttl: float, backend: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl if backend else ttl)
+        self.backend = backend
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is not None or self.backend is None:
+            return value
+    
+        raw = self.backend.get(key)
+        if raw is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+    
+    def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+        if self.backend is not None:
+            self.backend.set(key, json.dumps(value, separators=(",", ":")).encode(), self.ttl)
+    
+    def delete(self, *keys: str) -> None:
+        self.local.delete(*keys)
+        if self.backend is not None:
+            self.backend.delete(*keys)
+    
+    def generation(self, category: Optional[str]) -> int:
+        key = f"gen:{category or '*'}"
+        if self.backend is None:
+            return self._generations.get(key, 0)
+        raw = self.backend.get(key)
+        return int(raw) if raw else 0
+    
+    def bump_generation(self, category: Optional[str]) -> None:
+        key = f"gen:{category or '*'}"
+        if self.backend is None:
+            with self._lock:
+                self._generations[key] = self._generations.get(key, 0) + 1
+        else:
+            self.backend.incr(key)
+    
+    def listing_key(self, kind: str, category: Optional[str], *params: Any) -> str:
+        """Build a listing/count key tied to the current category generation."""
+        generation = self.generation(category)
+        return f"{kind}:{category or '*'}:{generation}:" + ":".join(str(p) for p in params)
+    
+    def invalidate_product(self, product_id: Any, slug: Optional[str], *categories: Optional[str]) -> None:
+        """Drop a product's entries and retire listings for its categories."""
+        self.delete(f"product:{product_id}", f"product:{slug}")
+        for category in set(categories) | {None}:
+            self.bump_generation(category)
+    
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "shared": {
+                "backend": type(self.backend).__name__ if self.backend else None,
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+            },
+        }
+
+
+catalog_cache = CatalogCache(
+    maxsize=settings.CATALOG_CACHE_SIZE,
+    ttl=settings.CATALOG_CACHE_TTL,
+    local_ttl=settings.CATALOG_CACHE_LOCAL_TTL,
+    backend=RedisBackend(settings.CATALOG_CACHE_URL) if settings.CATALOG_CACHE_URL else None,
+)
+
+
+class Snapshot:
+    """
+    A single computed value shared by all callers and refreshed ahead.
+
+    The first caller computes the value while concurrent callers wait for
+    the same result. Once it is older than `ttl`, callers keep getting
+    the previous value while one background thread recomputes it.
+    """
+    
+    def __init__(self, compute, ttl: float):
+        self.compute = compute
+        self.ttl = ttl
+        self.value = None
+        self.computed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+    
+    def _refresh(self) -> None:
+        try:
+            value = self.compute()
+            self.value, self.computed_at = value, time.monotonic()
+        finally:
+            self._refreshing = False
+    
+    def get(self) -> Any:
+        if self.value is None:
+            with self._lock:
+                if self.value is None:
+                    self._refreshing = True
+                    self._refresh()
+            return self.value
+        
+        if time.monotonic() - self.computed_at > self.ttl:
+            with self._lock:
+                if self._refreshing:
+                    return self.value
+                self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True).start()
+        return self.value
@@ -0,0 +1,119 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.serialization import RawJSONResponse
+
+
+def etag_for(body) -> str:
+    """
+    Weak ETag from a response body.
+    
+    Tags are computed before compression, so the same tag goes out for
+    every content-encoding; marking it weak keeps that within the spec.
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    return 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def http_timestamp(value: datetime) -> int:
+    """Whole seconds since the epoch; naive values are taken as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`."""
+    if header.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(headers: Headers, etag: str, modified: Optional[int] = None) -> bool:
+    """Check the request validators; If-None-Match wins over If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    
+    since = headers.get("if-modified-since")
+    if since and modified is not None:
+        try:
+            return modified <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_response(request: Request, entry: list, cache_control: str = "public, no-cache") -> Response:
+    """
+    Answer with a cached [body, etag, modified] entry, or 304 if the client has it.
+    
+    Callers that keep entries in a cache can answer revalidations without
+    touching the database.
+    """
+    body, etag, modified = entry
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = formatdate(modified, usegmt=True)
+    
+    if not_modified(request.headers, etag, modified):
+        return Response(status_code=304, headers=headers)
+    return RawJSONResponse(body, headers=headers)
+
+
+class ConditionalGetMiddleware:
+    """
+    Give buffered GET 200 responses a weak ETag and turn matches into 304s.
+    
+    Responses that set their own ETag and streamed responses (more than
+    one body message) pass through untouched.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+    
+        request_headers = Headers(scope=scope)
+        pending = None
+    
+        async def send_with_etag(message):
+            nonlocal pending
+            if message["type"] == "http.response.start":
+                if message["status"] == 200 and "etag" not in Headers(raw=message["headers"]):
+                    pending = message
+                    return
+                await send(message)
+                return
+    
+            if pending is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+    
+            start, pending = pending, None
+            if message.get("more_body", False):
+                await send(start)
+                await send(message)
+                return
+    
+            headers = MutableHeaders(scope=start)
+            etag = etag_for(message.get("body", b""))
+            headers["ETag"] = etag
+            if not_modified(request_headers, etag):
+                del headers["content-length"]
+                if "content-type" in headers:
+                    del headers["content-type"]
+                start["status"] = 304
+                message = {"type": "http.response.body", "body": b""}
+            await send(start)
+            await send(message)
+    
+        await self.app(scope, receive, send_with_etag)
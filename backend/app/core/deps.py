@@ -1,36 +1,75 @@
+import time
+import uuid
 from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_async_db, get_db
+from app.config import settings
+from app.core.cache import TTLCache
 from app.core.security import decode_access_token
 from app.models.user import User
+from app.schemas.user import Principal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Decoded token payloads keyed by token, and principals keyed by user id
+token_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    """Get the current authenticated user from JWT token."""
-    credentials_exception = HTTPException(
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
+
+
+def decode_token_cached(token: str) -> str:
+    """Decode a JWT (cached per token) and return its user id."""
+    payload = token_cache.get(token)
+    if payload is None or payload.get("exp", 0) < time.time():
+        payload = decode_access_token(token)
+        if payload is None:
+            raise credentials_exception()
+        token_cache.set(token, payload)
     
     user_id: str = payload.get("sub")
     if user_id is None:
-        raise credentials_exception
+        raise credentials_exception()
+    return user_id
+
+
+def invalidate_principal(user_id) -> None:
+    """Drop a cached principal after its flags or profile change."""
+    principal_cache.delete(str(user_id))
+
+
+def load_principal(db: Session, user_id: str) -> Optional[Principal]:
+    """Read a user's principal from the database into the cache; None if the user is gone."""
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    principal = Principal.model_validate(user)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    """Get the current authenticated user from JWT token."""
+    user_id = decode_token_cached(token)
     
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    
+    principal_cache.set(user_id, Principal.model_validate(user))
     
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -38,7 +77,65 @@ def get_current_user(
     return user
 
 
-def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+def get_current_principal(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    Get the id and flags of the current user.
+    
+    Served from the principal cache, so endpoints that only need these
+    fields do not query the users table on a hit.
+    """
+    user_id = decode_token_cached(token)
+    
+    principal = principal_cache.get(user_id) or load_principal(db, user_id)
+    if principal is None:
+        raise credentials_exception()
+    
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    return principal
+
+
+async def get_current_principal_async(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    get_current_principal on the async engine.
+    
+    Shares the request's AsyncSession with the endpoint, so with
+    DATABASE_ASYNC on an authenticated request neither opens a sync
+    session nor waits for a threadpool thread.
+    """
+    user_id = decode_token_cached(token)
+    
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        try:
+            user_uuid = uuid.UUID(user_id)
+        except ValueError:
+            raise credentials_exception()
+        user = (await db.execute(select(User).where(User.id == user_uuid))).scalar_one_or_none()
+        if user is None:
+            raise credentials_exception()
+        principal = Principal.model_validate(user)
+        principal_cache.set(user_id, principal)
+    
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    return principal
+
+
+# Routes depend on get_current_principal by name; in async mode that is the async one
+if settings.DATABASE_ASYNC:
+    get_current_principal = get_current_principal_async
+
+
+async def get_current_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
     """Verify that the current user is an admin."""
     if not current_user.is_admin:
         raise HTTPException(
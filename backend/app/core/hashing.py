@@ -0,0 +1,98 @@
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException, status
+from app.config import settings
+from app.core.security import verify_password, get_password_hash
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool.
+    
+    Hashing happens outside the request threadpool and the GIL, and at
+    most `max_pending` calls may be queued or running at once; beyond
+    that callers get a 503 straight away instead of waiting behind a
+    login storm. With `workers` set to 0 hashing runs inline.
+    """
+    
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0  # raised in the pool or lost a worker; not in the latency stats
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication is busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            if self.workers and self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    
+        started = time.perf_counter()
+        executor = self._executor
+        try:
+            result = fn(*args) if executor is None else executor.submit(fn, *args).result()
+        except BaseException as exc:
+            with self._lock:
+                self.pending -= 1
+                self.failed += 1
+                # A worker died; start a fresh pool on the next call
+                if isinstance(exc, BrokenProcessPool) and self._executor is executor:
+                    self._executor = None
+            raise
+    
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        return result
+    
+    def hash(self, password: str) -> str:
+        return self._run(get_password_hash, password)
+    
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._run(verify_password, plain_password, hashed_password)
+    
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,330 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from sqlalchemy import update
+from app.config import settings
+from app.core.cache import catalog_cache
+from app.database import SessionLocal
+from app.models.product import Product
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # without Pillow products are served without a srcset
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP"}
+DERIVATIVE_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})-(?P<width>\d+)\.(?P<format>avif|webp)$")
+DERIVATIVE_URL = "/api/images/"
+TOUCH_INTERVAL = 3600  # seconds between mtime bumps of a served file
+EVICT_TO = 0.9  # fraction of the size budget left after an eviction pass
+
+
+def original_path(url: str) -> Optional[str]:
+    """Local file behind an image URL under MEDIA_URL; None for remote or missing images."""
+    if not url or not url.startswith(settings.MEDIA_URL):
+        return None
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, url[len(settings.MEDIA_URL):]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def render_derivatives(path: str, source_url: str, cache_dir: str, widths, formats, quality: int) -> tuple:
+    """
+    Write resized copies of one original into the cache; runs in a worker process.
+    
+    Files are named by the SHA-256 of the original, so an unchanged image
+    is never encoded twice and identical uploads share derivatives.
+    Originals are never upscaled. Returns (digest, widths, bytes written).
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    directory = os.path.join(cache_dir, digest[:2])
+    os.makedirs(directory, exist_ok=True)
+    
+    # Lets a request for an evicted derivative find its original again
+    source = os.path.join(directory, f"{digest}.src")
+    if not os.path.exists(source):
+        write_atomic(source, source_url.encode())
+    
+    written = 0
+    with Image.open(io.BytesIO(data)) as image:
+        # Only the header is read so far; EXIF orientations 5-8 swap the sides
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) >= 5:
+            width, height = height, width
+        targets = sorted({min(target, width) for target in widths})
+    
+        frame = None
+        for target in targets:
+            missing = [fmt for fmt in formats if not os.path.exists(os.path.join(directory, f"{digest}-{target}.{fmt}"))]
+            if not missing:
+                continue
+            if frame is None:
+                frame = ImageOps.exif_transpose(image)
+                if frame.mode not in ("RGB", "RGBA"):
+                    frame = frame.convert("RGBA" if frame.has_transparency_data else "RGB")
+            resized = frame
+            if target < frame.width:
+                resized = frame.resize(
+                    (target, max(1, round(frame.height * target / frame.width))),
+                    Image.LANCZOS,
+                    reducing_gap=3.0
+                )
+            for fmt in missing:
+                buffer = io.BytesIO()
+                resized.save(buffer, PIL_FORMATS[fmt], quality=quality)
+                write_atomic(os.path.join(directory, f"{digest}-{target}.{fmt}"), buffer.getvalue())
+                written += buffer.tell()
+    return digest, targets, written
+
+
+class ImagePipeline:
+    """
+    Renders resized WebP/AVIF copies of product images off the request path.
+    
+    `submit` only queues a product; a dispatcher thread renders its local
+    originals in a process pool, stores the product's srcset map and
+    keeps the content-addressed disk cache under `max_bytes` by evicting
+    the least recently served files. Jobs are deduplicated, and beyond
+    `max_queued` new ones are dropped (and counted) rather than blocking.
+    """
+    
+    def __init__(self, cache_dir: str, widths, formats, quality: int, workers: int, max_bytes: int, max_queued: int):
+        self.cache_dir = cache_dir
+        self.widths = sorted(widths)
+        self.formats = [fmt for fmt in formats if fmt in PIL_FORMATS and Image is not None and features.check(fmt)]
+        self.quality = quality
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.max_queued = max_queued
+        self.rendered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.cache_bytes = None  # measured on the first eviction check
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.formats)
+    
+    def _queue(self, job: tuple) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if job not in self._jobs and len(self._jobs) >= self.max_queued:
+                self.dropped += 1
+                return
+            self._jobs[job] = None
+        self._wake.set()
+    
+    def submit(self, product_id) -> None:
+        """Queue (re)rendering a product's images and refreshing its srcset."""
+        self._queue(("product", product_id))
+    
+    def derivative_path(self, name: str) -> Optional[str]:
+        """
+        Path of a cached derivative, marking it as recently used.
+    
+        A missing (evicted) derivative is queued for rendering again and
+        None is returned.
+        """
+        match = DERIVATIVE_NAME.match(name)
+        if match is None:
+            return None
+        path = os.path.join(self.cache_dir, name[:2], name)
+        try:
+            modified = os.stat(path).st_mtime
+        except FileNotFoundError:
+            source = self.source_url(match["digest"])
+            if source is not None and original_path(source) is not None:
+                self._queue(("original", source))
+            return None
+        if time.time() - modified > TOUCH_INTERVAL:
+            os.utime(path)
+        return path
+    
+    def source_url(self, digest: str) -> Optional[str]:
+        """URL of the original a digest was rendered from."""
+        try:
+            with open(os.path.join(self.cache_dir, digest[:2], f"{digest}.src"), encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+    
+    def srcset(self, digest: str, widths) -> dict:
+        return {
+            fmt: ", ".join(f"{DERIVATIVE_URL}{digest}-{width}.{fmt} {width}w" for width in widths)
+            for fmt in self.formats
+        }
+    
+    def _render(self, urls) -> dict:
+        """Render many originals in parallel; returns {url: (digest, widths)} for the ones that worked."""
+        with self._lock:
+            if self.workers and self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+    
+        jobs = {}
+        for url in urls:
+            path = original_path(url)
+            if path is None:
+                continue
+            args = (path, url, self.cache_dir, self.widths, self.formats, self.quality)
+            jobs[url] = executor.submit(render_derivatives, *args) if executor else args
+    
+        results = {}
+        for url, job in jobs.items():
+            try:
+                digest, widths, written = job.result() if executor else render_derivatives(*job)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next job
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                self.failed += 1
+                logger.exception("Image worker pool broke while rendering %s", url)
+                continue
+            except Exception:
+                self.failed += 1
+                logger.exception("Could not render derivatives of %s", url)
+                continue
+            self.rendered += 1
+            if self.cache_bytes is not None:
+                self.cache_bytes += written
+            results[url] = (digest, widths)
+        self._evict()
+        return results
+    
+    def _refresh_product(self, product_id) -> None:
+        db = SessionLocal()
+        try:
+            product = db.get(Product, product_id)
+            if product is None:
+                return
+            rendered = self._render(dict.fromkeys(product.images or []))
+            srcset = {url: self.srcset(digest, widths) for url, (digest, widths) in rendered.items()}
+            if srcset == (product.srcset or {}):
+                return
+            db.execute(
+                update(Product).where(Product.id == product_id).values(srcset=srcset),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+            catalog_cache.invalidate_product(product.id, product.slug, product.category)
+        finally:
+            db.close()
+    
+    def _evict(self) -> None:
+        """Delete the least recently served derivatives once the cache is over budget."""
+        if self.cache_bytes is not None and self.cache_bytes <= self.max_bytes:
+            return
+        files = []
+        for directory in os.scandir(self.cache_dir) if os.path.isdir(self.cache_dir) else ():
+            if directory.is_dir():
+                for entry in os.scandir(directory.path):
+                    if DERIVATIVE_NAME.match(entry.name):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        self.cache_bytes = sum(size for _, size, _ in files)
+        if self.cache_bytes <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            if self.cache_bytes <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.cache_bytes -= size
+            self.evicted += 1
+    
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                job = next(iter(self._jobs), None)
+                if job is not None:
+                    del self._jobs[job]
+                else:
+                    self._wake.clear()
+            if job is None:
+                self._wake.wait()
+                continue
+            kind, key = job
+            try:
+                if kind == "product":
+                    self._refresh_product(key)
+                else:
+                    self._render([key])
+            except Exception:
+                logger.exception("Image job %s failed", job)
+    
+    def start(self) -> None:
+        if self.enabled and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="image-pipeline", daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self) -> dict:
+        return {
+            "formats": self.formats,
+            "workers": self.workers,
+            "queued": len(self._jobs),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "cache_bytes": self.cache_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+image_pipeline = ImagePipeline(
+    cache_dir=settings.IMAGE_CACHE_DIR,
+    widths=settings.IMAGE_WIDTHS,
+    formats=settings.IMAGE_FORMATS,
+    quality=settings.IMAGE_QUALITY,
+    workers=settings.IMAGE_WORKERS,
+    max_bytes=settings.IMAGE_CACHE_MAX_BYTES,
+    max_queued=settings.IMAGE_MAX_QUEUED
+)
@@ -0,0 +1,303 @@
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.cache import catalog_cache
+from app.database import SessionLocal
+from app.models.inventory import StockShard, StockReservation
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product, ProductVariant
+from app.core.tasks import PeriodicTask
+
+
+# Statuses that turn an order's stock reservation into a sale
+PAID_STATUSES = (OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED)
+
+
+def out_of_stock(product_ids, variant_ids=()) -> HTTPException:
+    detail = {"message": "Insufficient stock", "product_ids": sorted(str(pid) for pid in product_ids)}
+    if variant_ids:
+        detail["variant_ids"] = sorted(str(vid) for vid in variant_ids)
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+def adjust_stock(db: Session, model, deltas: dict, require_available: bool = False) -> set:
+    """
+    Apply stock deltas to many products (or variants, by `model`) in one UPDATE.
+    
+    With `require_available` each row only changes if it has enough stock
+    for a negative delta. Returns the ids of the rows that changed.
+    """
+    if not deltas:
+        return set()
+    
+    delta = case(*((model.id == key, value) for key, value in deltas.items()))
+    statement = update(model).where(model.id.in_(deltas)).values(
+        stock_quantity=model.stock_quantity + delta
+    )
+    if require_available:
+        statement = statement.where(model.stock_quantity + delta >= 0)
+    
+    result = db.execute(
+        statement.returning(model.id),
+        execution_options={"synchronize_session": False}
+    )
+    return set(result.scalars().all())
+
+
+def take_from_shard(db: Session, product: Product, quantity: int):
+    """
+    Take stock from the shards of a sharded product.
+    
+    Tries one shard at a time from a random start, so concurrent buyers
+    spread out; if no single shard holds `quantity`, the take is split
+    across shards under a lock on all of them. Returns a list of
+    (shard, quantity taken), or None if the product is short.
+    """
+    start = random.randrange(product.stock_shards)
+    for offset in range(product.stock_shards):
+        shard = (start + offset) % product.stock_shards
+        taken = db.execute(
+            update(StockShard).where(
+                StockShard.product_id == product.id,
+                StockShard.shard == shard,
+                StockShard.quantity >= quantity
+            ).values(quantity=StockShard.quantity - quantity),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        if taken:
+            return [(shard, quantity)]
+    
+    # Lock in shard order so two splitting buyers can't deadlock
+    shards = db.execute(
+        select(StockShard.shard, StockShard.quantity).where(
+            StockShard.product_id == product.id,
+            StockShard.quantity > 0
+        ).order_by(StockShard.shard).with_for_update()
+    ).all()
+    if sum(available for _, available in shards) < quantity:
+        return None
+    takes = []
+    remaining = quantity
+    for shard, available in shards:
+        take = min(available, remaining)
+        db.execute(
+            update(StockShard).where(
+                StockShard.product_id == product.id,
+                StockShard.shard == shard
+            ).values(quantity=StockShard.quantity - take),
+            execution_options={"synchronize_session": False}
+        )
+        takes.append((shard, take))
+        remaining -= take
+        if not remaining:
+            break
+    return takes
+
+
+def reserve_stock(db: Session, order_id, lines) -> None:
+    """
+    Reserve stock for an order inside the caller's transaction.
+    
+    `lines` is a list of (product, variant or None, quantity). Variant
+    lines take from the variant's own stock and plain products from the
+    product row, each with a single conditional UPDATE for the whole
+    order; sharded products take from their shards. Raises 409 if
+    anything is short, leaving the transaction for the caller to roll back.
+    """
+    quantities = defaultdict(int)
+    variant_quantities = defaultdict(int)
+    products = {}
+    variant_products = {}
+    for product, variant, quantity in lines:
+        if variant is not None:
+            variant_quantities[variant.id] += quantity
+            variant_products[variant.id] = product.id
+        else:
+            quantities[product.id] += quantity
+            products[product.id] = product
+    
+    plain = {pid: -qty for pid, qty in quantities.items() if not products[pid].stock_shards}
+    reserved = adjust_stock(db, Product, plain, require_available=True)
+    variants = {vid: -qty for vid, qty in variant_quantities.items()}
+    reserved_variants = adjust_stock(db, ProductVariant, variants, require_available=True)
+    missing = set(plain) - reserved
+    missing_variants = set(variants) - reserved_variants
+    if missing or missing_variants:
+        raise out_of_stock(missing | {variant_products[vid] for vid in missing_variants}, missing_variants)
+    
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.RESERVATION_TTL_MINUTES)
+    reservations = [
+        {
+            "order_id": order_id, "product_id": pid, "variant_id": None, "shard": None,
+            "quantity": -delta, "expires_at": expires_at
+        }
+        for pid, delta in plain.items()
+    ] + [
+        {
+            "order_id": order_id, "product_id": variant_products[vid], "variant_id": vid, "shard": None,
+            "quantity": -delta, "expires_at": expires_at
+        }
+        for vid, delta in variants.items()
+    ]
+    
+    for pid, qty in quantities.items():
+        if pid in plain:
+            continue
+        takes = take_from_shard(db, products[pid], qty)
+        if takes is None:
+            raise out_of_stock([pid])
+        reservations.extend(
+            {
+                "order_id": order_id, "product_id": pid, "variant_id": None, "shard": shard,
+                "quantity": taken, "expires_at": expires_at
+            }
+            for shard, taken in takes
+        )
+    
+    db.execute(insert(StockReservation), reservations)
+
+
+def confirm_reservations(db: Session, order_ids) -> None:
+    """Make an order's reserved stock permanent (e.g. once paid)."""
+    db.query(StockReservation).filter(
+        StockReservation.order_id.in_(order_ids)
+    ).delete(synchronize_session=False)
+
+
+def release_reservations(db: Session, order_ids) -> set:
+    """
+    Return an order's reserved stock to the products, variants and shards
+    it came from.
+    
+    Returns the ids of the restocked products.
+    """
+    reservations = db.query(StockReservation).filter(StockReservation.order_id.in_(order_ids)).all()
+    
+    plain = defaultdict(int)
+    variants = defaultdict(int)
+    for reservation in reservations:
+        if reservation.variant_id is not None:
+            variants[reservation.variant_id] += reservation.quantity
+        elif reservation.shard is None:
+            plain[reservation.product_id] += reservation.quantity
+        else:
+            db.execute(
+                update(StockShard).where(
+                    StockShard.product_id == reservation.product_id,
+                    StockShard.shard == reservation.shard
+                ).values(quantity=StockShard.quantity + reservation.quantity),
+                execution_options={"synchronize_session": False}
+            )
+    adjust_stock(db, Product, plain)
+    adjust_stock(db, ProductVariant, variants)
+    confirm_reservations(db, order_ids)
+    return {reservation.product_id for reservation in reservations}
+
+
+def change_order_status(db: Session, order: Order, new_status: OrderStatus) -> set:
+    """
+    Move an order to `new_status`, settling its stock reservation.
+    
+    Paying a pending order keeps its stock; cancelling returns it. A
+    cancelled order has to take its stock again before it is reopened
+    or paid, and raises 409 if that stock has since been sold. Returns
+    the ids of products whose stock changed, to forget after commit.
+    """
+    changed = set()
+    if order.status == OrderStatus.CANCELLED and new_status != OrderStatus.CANCELLED:
+        changed = reserve_order_stock(db, order)
+        if new_status in PAID_STATUSES:
+            confirm_reservations(db, [order.id])
+    elif order.status == OrderStatus.PENDING and new_status in PAID_STATUSES:
+        confirm_reservations(db, [order.id])
+    elif order.status != OrderStatus.CANCELLED and new_status == OrderStatus.CANCELLED:
+        changed = release_reservations(db, [order.id])
+    order.status = new_status
+    return changed
+
+
+def reserve_order_stock(db: Session, order: Order) -> set:
+    """Reserve the stock of an order's items again; returns the product ids."""
+    items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_({item.product_id for item in items}))}
+    variant_ids = {item.variant_id for item in items if item.variant_id is not None}
+    variants = {v.id: v for v in db.query(ProductVariant).filter(ProductVariant.id.in_(variant_ids))} if variant_ids else {}
+    reserve_stock(db, order.id, [
+        (products[item.product_id], variants.get(item.variant_id), item.quantity) for item in items
+    ])
+    return set(products)
+
+
+def forget_cached_stock(db: Session, product_ids) -> None:
+    """Drop cached product details whose stock changed and retire the listings showing them."""
+    if not product_ids:
+        return
+    rows = db.query(Product.id, Product.slug, Product.category).filter(Product.id.in_(product_ids)).all()
+    catalog_cache.delete(*(f"product:{key}" for row in rows for key in (row.id, row.slug)))
+    for category in {row.category for row in rows} | {None}:
+        catalog_cache.bump_generation(category)
+
+
+def set_stock_shards(db: Session, product: Product, shards: int) -> None:
+    """Spread a product's stock over `shards` rows, or fold it back with 0."""
+    if product.stock_shards:
+        product.stock_quantity = db.query(
+            func.coalesce(func.sum(StockShard.quantity), 0)
+        ).filter(StockShard.product_id == product.id).scalar()
+        db.query(StockShard).filter(StockShard.product_id == product.id).delete()
+    
+    product.stock_shards = shards
+    if shards:
+        share, extra = divmod(product.stock_quantity, shards)
+        db.execute(insert(StockShard), [
+            {"product_id": product.id, "shard": shard, "quantity": share + (1 if shard < extra else 0)}
+            for shard in range(shards)
+        ])
+
+
+def sync_sharded_stock(db: Session) -> None:
+    """Refresh stock_quantity of sharded products from their shards, touching only rows that drifted."""
+    shard_total = select(func.coalesce(func.sum(StockShard.quantity), 0)).where(
+        StockShard.product_id == Product.id
+    ).scalar_subquery()
+    db.execute(
+        update(Product).where(
+            Product.stock_shards > 0,
+            Product.stock_quantity != shard_total
+        ).values(stock_quantity=shard_total),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def release_expired_reservations() -> int:
+    """Cancel pending orders whose reservations expired and restock them."""
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        expired = select(StockReservation.order_id).where(StockReservation.expires_at < now)
+        # Claim the orders first so a concurrent payment can't be cancelled
+        order_ids = db.execute(
+            update(Order).where(
+                Order.id.in_(expired),
+                Order.status == OrderStatus.PENDING
+            ).values(status=OrderStatus.CANCELLED).returning(Order.id),
+            execution_options={"synchronize_session": False}
+        ).scalars().all()
+        product_ids = release_reservations(db, order_ids) if order_ids else set()
+        sync_sharded_stock(db)
+        db.commit()
+        forget_cached_stock(db, product_ids)
+        return len(order_ids)
+    finally:
+        db.close()
+
+
+reservation_sweeper = PeriodicTask(
+    "reservation-sweeper",
+    release_expired_reservations,
+    interval=settings.RESERVATION_SWEEP_SECONDS
+)
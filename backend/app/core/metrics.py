@@ -0,0 +1,232 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0)
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            cumulative = 0
+            bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                labels = format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read when metrics are scraped."""
+    
+    def __init__(self, name: str, help: str, read, labels=()):
+        self.name = name
+        self.help = help
+        self.read = read  # () -> {label values: value}
+        self.labels = tuple(labels)
+    
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(self.read().items()):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class RequestStats:
+    """SQL work done while serving one request."""
+    __slots__ = ("scope", "queries", "db_seconds", "statements")
+    
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = None  # a list while the request is profiled
+
+
+# Set by MetricsMiddleware; copied into the threadpool that runs sync endpoints
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+REQUEST_LABELS = ("method", "route")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template.", LATENCY_BUCKETS, REQUEST_LABELS
+)
+requests_total = Counter("http_requests_total", "Requests served, by route template and status.", REQUEST_LABELS + ("status",))
+request_queries = Histogram(
+    "http_request_sql_queries", "SQL statements run per request.", QUERY_COUNT_BUCKETS, REQUEST_LABELS
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", LATENCY_BUCKETS, REQUEST_LABELS
+)
+queries_total = Counter("db_queries_total", "SQL statements run, in and out of requests.", ("engine",))
+query_seconds_total = Counter("db_query_seconds_total", "Time spent in SQL statements.", ("engine",))
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waited for a pooled connection.", POOL_WAIT_BUCKETS, ("engine",)
+)
+
+engines = {}  # label -> Engine
+
+
+def pool_state() -> dict:
+    values = {}
+    for label, engine in engines.items():
+        pool = engine.pool
+        for state in ("size", "checkedout", "checkedin", "overflow"):
+            read = getattr(pool, state, None)
+            if read is not None:
+                values[(label, state)] = read()
+    return values
+
+
+registry = [
+    request_duration,
+    requests_total,
+    request_queries,
+    request_db_time,
+    queries_total,
+    query_seconds_total,
+    pool_wait,
+    Gauge("db_pool_connections", "Connections by pool state: size, checkedout, checkedin, overflow.",
+          pool_state, ("engine", "state")),
+]
+
+
+def instrument_engine(engine: Engine, label: str) -> None:
+    """Count statements and DB time per request, and time pool checkouts."""
+    engines[label] = engine
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        queries_total.inc(label)
+        query_seconds_total.inc(label, amount=elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.statements is not None:
+                stats.statements.append((statement, round(elapsed * 1000, 3)))
+    
+    @event.listens_for(engine, "handle_error")
+    def failed_query(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+    
+    # Pools have no "waiting" event, so time the checkout call itself
+    pool = engine.pool
+    connect = pool.connect
+    
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_wait.observe(time.perf_counter() - started, label)
+    
+    pool.connect = timed_connect
+
+
+def render() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """Record latency, status and SQL work of each request under its route template."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+    
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+    
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "other"))
+            request_duration.observe(elapsed, *labels)
+            requests_total.inc(*labels, str(status))
+            request_queries.observe(stats.queries, *labels)
+            request_db_time.observe(stats.db_seconds, *labels)
@@ -0,0 +1,203 @@
+import logging
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.upsert import upsert
+from app.database import SessionLocal
+from app.models.outbox import OutboxEvent, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 3600  # seconds
+
+# topic -> handler(db, payload); a handler may return a callable to run after commit
+handlers = {}
+
+
+def outbox_handler(topic: str):
+    """Register the function that processes events of `topic`."""
+    def register(fn: Callable) -> Callable:
+        handlers[topic] = fn
+        return fn
+    return register
+
+
+class PermanentError(Exception):
+    """Raised by a handler when a retry can't succeed; the event is marked failed at once."""
+
+
+def enqueue(db: Session, topic: str, payload: dict, key: Optional[str] = None) -> None:
+    """
+    Record an event in the caller's transaction.
+    
+    It is processed once that transaction commits; an event whose `key`
+    was already recorded is ignored.
+    """
+    statement = upsert(db, OutboxEvent).values(
+        id=uuid.uuid4(),
+        topic=topic,
+        key=key,
+        payload=payload,
+        status=OutboxStatus.PENDING,
+        attempts=0,
+        available_at=datetime.now(timezone.utc)
+    )
+    db.execute(statement.on_conflict_do_nothing(index_elements=["key"]))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the next attempt."""
+    delay = min(settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxWorker:
+    """
+    Drains the outbox on `workers` daemon threads.
+    
+    Each thread claims up to `batch_size` due events by pushing their
+    `available_at` out by a lease (rows locked by other workers are
+    skipped on PostgreSQL), then runs each event's handler in its own
+    transaction together with marking it done. A failed event is retried
+    with exponential backoff and marked failed after `max_attempts` (or
+    at once on a PermanentError); an event claimed by a worker that died
+    is picked up once its lease ends.
+    """
+    
+    def __init__(self, workers: int, batch_size: int, poll_interval: float, lease: int, max_attempts: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+    
+    def notify(self) -> None:
+        """Wake the workers now rather than at the next poll."""
+        self._wake.set()
+    
+    def claim(self, db: Session) -> list:
+        now = datetime.now(timezone.utc)
+        due = select(OutboxEvent.id).where(
+            OutboxEvent.status == OutboxStatus.PENDING,
+            OutboxEvent.available_at <= now
+        ).order_by(OutboxEvent.available_at).limit(self.batch_size).with_for_update(skip_locked=True)
+        events = db.execute(
+            update(OutboxEvent).where(OutboxEvent.id.in_(due.scalar_subquery())).values(
+                available_at=now + timedelta(seconds=self.lease)
+            ).returning(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts),
+            execution_options={"synchronize_session": False}
+        ).all()
+        db.commit()
+        return events
+    
+    def process(self, db: Session, event) -> None:
+        handler = handlers.get(event.topic)
+        try:
+            if handler is None:
+                raise LookupError(f"No outbox handler for {event.topic!r}")
+            after_commit = handler(db, event.payload)
+            db.execute(
+                update(OutboxEvent).where(OutboxEvent.id == event.id).values(
+                    status=OutboxStatus.DONE, attempts=event.attempts + 1, processed_at=func.now(), last_error=None
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            attempts = event.attempts + 1
+            gave_up = attempts >= self.max_attempts or isinstance(exc, PermanentError)
+            logger.warning("Outbox event %s (%s) failed, attempt %d", event.id, event.topic, attempts, exc_info=True)
+            db.execute(
+                update(OutboxEvent).where(OutboxEvent.id == event.id).values(
+                    status=OutboxStatus.FAILED if gave_up else OutboxStatus.PENDING,
+                    attempts=attempts,
+                    available_at=datetime.now(timezone.utc) + timedelta(seconds=retry_delay(attempts)),
+                    last_error=f"{type(exc).__name__}: {exc}"[:2000]
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            db.commit()
+            with self._lock:
+                if gave_up:
+                    self.failed += 1
+                else:
+                    self.retried += 1
+            return
+    
+        with self._lock:
+            self.processed += 1
+        if after_commit is not None:
+            try:
+                after_commit()
+            except Exception:
+                logger.exception("After-commit hook of outbox event %s failed", event.id)
+    
+    def run_once(self) -> int:
+        """Claim and process one batch; returns how many events it held."""
+        db = SessionLocal()
+        try:
+            events = self.claim(db)
+            for event in events:
+                self.process(db, event)
+            return len(events)
+        finally:
+            db.close()
+    
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_once() == self.batch_size:
+                    continue
+            except Exception:
+                logger.exception("Outbox worker pass failed")
+            if self._wake.wait(self.poll_interval):
+                self._wake.clear()
+    
+    def start(self) -> None:
+        if not self._threads:
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"outbox-worker-{number}", daemon=True)
+                for number in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_interval + 5)
+        self._threads = []
+    
+    def stats(self, db: Session) -> dict:
+        counts = dict(db.query(OutboxEvent.status, func.count()).group_by(OutboxEvent.status).all())
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            **{status.value: counts.get(status, 0) for status in OutboxStatus},
+        }
+
+
+outbox_worker = OutboxWorker(
+    workers=settings.OUTBOX_WORKERS,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_SECONDS,
+    lease=settings.OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+)
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import literal, text, tuple_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(order: list, row) -> str:
+    """Encode the sort key values of a row as an opaque cursor."""
+    payload = {
+        "k": [column.key for column, _ in order],
+        "v": [getattr(row, column.key) for column, _ in order],
+    }
+    raw = json.dumps(payload, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(order: list, cursor: str) -> list:
+    """Decode a cursor into typed sort key values for the given order."""
+    invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["k"] != [column.key for column, _ in order]:
+            raise invalid
+        values = []
+        for (column, _), value in zip(order, payload["v"], strict=True):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(python_type(value))
+        return values
+    except HTTPException:
+        raise
+    except (ValueError, TypeError, KeyError):
+        raise invalid
+
+
+def _bind_value(column, value, dialect: str):
+    """Bind a cursor value so it compares like the stored column value."""
+    # SQLite stores server-side timestamps as text without microseconds
+    if dialect == "sqlite" and isinstance(value, datetime) and not value.microsecond:
+        return literal(value.strftime("%Y-%m-%d %H:%M:%S"))
+    return literal(value, column.type)
+
+
+def paginate(query: Query, order: list, per_page: int, page: int = 1, cursor: Optional[str] = None):
+    """
+    Fetch one page of `query` sorted by `order`.
+    
+    `order` is a list of (column, descending) pairs ending in a unique
+    tiebreaker. With `cursor` set the page starts after the row the
+    cursor points at (an empty cursor starts at the beginning), so deep
+    pages cost the same as the first one; otherwise `page` is used as an
+    offset. Returns the items and the cursor of the next page, if any.
+    """
+    descending = order[0][1]
+    assert all(desc == descending for _, desc in order), "keyset order must share one direction"
+    
+    query = query.order_by(*(column.desc() if desc else column.asc() for column, desc in order))
+    
+    if cursor:
+        dialect = query.session.get_bind().dialect.name
+        keys = tuple_(*(column for column, _ in order))
+        values = tuple_(*(
+            _bind_value(column, value, dialect)
+            for (column, _), value in zip(order, decode_cursor(order, cursor))
+        ))
+        query = query.filter(keys < values if descending else keys > values)
+    elif cursor is None:
+        query = query.offset((page - 1) * per_page)
+    
+    rows = query.limit(per_page + 1).all()
+    next_cursor = encode_cursor(order, rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+
+def estimate_count(query: Query) -> int:
+    """
+    Estimate the number of rows a query returns without counting them.
+    
+    Uses the planner's row estimate on Postgres and falls back to an
+    exact count elsewhere.
+    """
+    bind = query.session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return query.order_by(None).count()
+    
+    # Compile with :name placeholders and let text() bind them, so the
+    # driver's own paramstyle is used (asyncpg takes $1, not %(name)s)
+    dialect = type(bind.dialect)(paramstyle="named")
+    compiled = query.order_by(None).statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = query.session.execute(
+        text("EXPLAIN (FORMAT JSON) " + compiled.string), compiled.params
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,229 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from decimal import Decimal
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from app.config import settings
+from app.core.inventory import change_order_status, forget_cached_stock
+from app.core.outbox import PermanentError, enqueue, outbox_handler
+from app.models.order import Order, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_TOLERANCE = 300  # seconds a signed webhook stays valid
+
+# Provider event types and the order status they lead to. A failed
+# attempt is not final (the customer can retry the same intent), so only
+# cancellation or the reservation sweeper cancels an unpaid order.
+EVENT_STATUSES = {
+    "payment_intent.succeeded": OrderStatus.PAID,
+    "payment_intent.canceled": OrderStatus.CANCELLED,
+}
+
+
+def minor_units(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value())
+
+
+class PaymentProvider:
+    """Creates payments and checks the webhooks that report on them."""
+    
+    name = ""
+    
+    def create_payment(self, order: Order, idempotency_key: str) -> str:
+        """Start a payment for an order and return its provider id."""
+        raise NotImplementedError
+    
+    def parse_event(self, payload: bytes, signature: Optional[str]) -> dict:
+        """
+        Verify a webhook and return its event.
+    
+        Raises ValueError if it isn't genuine, and PaymentNotConfigured
+        if it can't be verified.
+        """
+        raise NotImplementedError
+    
+    def refund(self, payment_id: str, idempotency_key: str) -> str:
+        """Refund a payment in full and return the refund id."""
+        raise NotImplementedError
+
+
+class PaymentNotConfigured(PermanentError):
+    """The provider is missing the credentials a call needs."""
+
+
+class StripeProvider(PaymentProvider):
+    """
+    Stripe PaymentIntents.
+    
+    Without STRIPE_SECRET_KEY calls fail at once (and their outbox jobs
+    with them), and without STRIPE_WEBHOOK_SECRET every webhook is
+    refused, since an empty key would accept anyone's signature. Requests
+    time out after STRIPE_TIMEOUT_SECONDS with at most
+    STRIPE_MAX_NETWORK_RETRIES retries.
+    """
+    
+    name = "stripe"
+    
+    def __init__(self):
+        self._client = None
+    
+    def client(self):
+        if not settings.STRIPE_SECRET_KEY:
+            raise PaymentNotConfigured("STRIPE_SECRET_KEY is not set")
+        if self._client is None:
+            import stripe
+            self._client = stripe.StripeClient(
+                settings.STRIPE_SECRET_KEY,
+                max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                http_client=stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+            )
+        return self._client
+    
+    def create_payment(self, order: Order, idempotency_key: str) -> str:
+        intent = self.client().payment_intents.create(
+            params={
+                "amount": minor_units(order.total_amount),
+                "currency": settings.PAYMENT_CURRENCY,
+                "metadata": {"order_id": str(order.id), "order_number": order.order_number},
+            },
+            options={"idempotency_key": idempotency_key}
+        )
+        return intent.id
+    
+    def refund(self, payment_id: str, idempotency_key: str) -> str:
+        refund = self.client().refunds.create(
+            params={"payment_intent": payment_id},
+            options={"idempotency_key": idempotency_key}
+        )
+        return refund.id
+    
+    def parse_event(self, payload: bytes, signature: Optional[str]) -> dict:
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise PaymentNotConfigured("STRIPE_WEBHOOK_SECRET is not set")
+        import stripe
+        try:
+            stripe.Webhook.construct_event(payload, signature or "", settings.STRIPE_WEBHOOK_SECRET)
+        except stripe.SignatureVerificationError as exc:
+            raise ValueError(str(exc)) from exc
+        return json.loads(payload)
+
+
+class FakeProvider(PaymentProvider):
+    """
+    Local stand-in for Stripe for development and tests.
+    
+    Payment ids are derived from the idempotency key, and webhooks are
+    signed with STRIPE_WEBHOOK_SECRET the way Stripe signs them, so the
+    webhook endpoint and worker run exactly as they would in production.
+    Anyone holding the secret can mark orders paid, so it only starts
+    when PAYMENT_FAKE_ENABLED is set and a secret is configured.
+    """
+    
+    name = "fake"
+    
+    def __init__(self):
+        if not settings.PAYMENT_FAKE_ENABLED or not settings.STRIPE_WEBHOOK_SECRET:
+            raise RuntimeError(
+                'PAYMENT_PROVIDER="fake" needs PAYMENT_FAKE_ENABLED and a STRIPE_WEBHOOK_SECRET; '
+                "it is meant for development and tests only"
+            )
+        self.secret = settings.STRIPE_WEBHOOK_SECRET.encode()
+    
+    def create_payment(self, order: Order, idempotency_key: str) -> str:
+        return f"pi_fake_{uuid.uuid5(uuid.NAMESPACE_URL, idempotency_key).hex}"
+    
+    def refund(self, payment_id: str, idempotency_key: str) -> str:
+        return f"re_fake_{uuid.uuid5(uuid.NAMESPACE_URL, idempotency_key).hex}"
+    
+    def sign(self, payload: bytes, timestamp: Optional[int] = None) -> str:
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        digest = hmac.new(self.secret, f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+        return f"t={timestamp},v1={digest}"
+    
+    def event(self, event_type: str, payment_id: str) -> Tuple[bytes, str]:
+        """A signed webhook (payload, signature header) reporting on a payment."""
+        payload = json.dumps({
+            "id": f"evt_fake_{uuid.uuid4().hex}",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": {"id": payment_id, "object": "payment_intent"}},
+        }).encode()
+        return payload, self.sign(payload)
+    
+    def parse_event(self, payload: bytes, signature: Optional[str]) -> dict:
+        parts = dict(part.split("=", 1) for part in (signature or "").split(",") if "=" in part)
+        try:
+            timestamp = int(parts.get("t", ""))
+        except ValueError:
+            raise ValueError("Missing signature timestamp")
+        if abs(time.time() - timestamp) > SIGNATURE_TOLERANCE:
+            raise ValueError("Signature timestamp outside the tolerance zone")
+        if not hmac.compare_digest(self.sign(payload, timestamp), f"t={timestamp},v1={parts.get('v1', '')}"):
+            raise ValueError("Signature mismatch")
+        return json.loads(payload)
+
+
+PROVIDERS = {provider.name: provider for provider in (StripeProvider, FakeProvider)}
+
+payment_provider = PROVIDERS[settings.PAYMENT_PROVIDER]()
+
+
+@outbox_handler("order.created")
+def start_payment(db, payload: dict):
+    """Create the order's payment (once) and send its confirmation."""
+    order = db.get(Order, uuid.UUID(payload["order_id"]))
+    if order is None or order.status != OrderStatus.PENDING:
+        return None
+    if order.payment_id is None:
+        order.payment_id = payment_provider.create_payment(order, idempotency_key=f"order-{order.id}")
+    # No mail transport yet; the confirmation is logged once the payment id is stored
+    details = (order.order_number, order.user_id, order.payment_id)
+    return lambda: logger.info("Order %s confirmed for user %s, payment %s", *details)
+
+
+@outbox_handler("payment.event")
+def apply_payment_event(db, payload: dict):
+    """
+    Pay or cancel the order a payment webhook reports on.
+    
+    The order is found by the payment id stored when the payment was
+    created, never by event metadata. A payment that succeeds after the
+    reservation sweeper cancelled its order takes the stock again, or is
+    refunded if the stock has been sold since.
+    """
+    new_status = EVENT_STATUSES.get(payload.get("type"))
+    if new_status is None:
+        return None
+    payment_id = payload["data"]["object"]["id"]
+    order = db.query(Order).filter(Order.payment_id == payment_id).with_for_update().first()
+    if order is None:
+        # The payment may be reported before start_payment has stored its id
+        raise LookupError(f"No order for payment {payment_id}")
+    
+    if order.status == OrderStatus.CANCELLED and new_status == OrderStatus.PAID:
+        try:
+            with db.begin_nested():
+                changed = change_order_status(db, order, new_status)
+        except HTTPException:
+            enqueue(db, "payment.refund", {"order_id": str(order.id), "payment_id": payment_id}, key=f"refund:{payment_id}")
+            order_number = order.order_number
+            return lambda: logger.warning("Order %s was paid after it lapsed and is out of stock; refunding", order_number)
+        return lambda: forget_cached_stock(db, changed)
+    
+    # Late or repeated events never undo a settled order
+    if order.status != OrderStatus.PENDING:
+        return None
+    restocked = change_order_status(db, order, new_status)
+    return lambda: forget_cached_stock(db, restocked)
+
+
+@outbox_handler("payment.refund")
+def refund_payment(db, payload: dict):
+    """Refund a payment in full (once, by its idempotency key)."""
+    refund_id = payment_provider.refund(payload["payment_id"], idempotency_key=f"refund-{payload['payment_id']}")
+    return lambda: logger.info("Refunded payment %s of order %s: %s", payload["payment_id"], payload["order_id"], refund_id)
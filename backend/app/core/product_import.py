@@ -0,0 +1,280 @@
+import csv
+import io
+import json
+import uuid
+from collections import defaultdict
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import func, null, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.cache import catalog_cache
+from app.core.images import image_pipeline
+from app.core.text import build_search_document
+from app.core.upsert import upsert
+from app.core.variants import replace_variants, variant_fields
+from app.models.product import Product, ProductVariant, SEARCH_FIELDS
+from app.schemas.product import ProductCreate, ProductVariantCreate
+
+# Fields an import writes, also the export layout after `id`
+PRODUCT_FIELDS = tuple(ProductCreate.model_fields)
+EXPORT_FIELDS = ("id",) + PRODUCT_FIELDS
+VARIANT_FIELDS = tuple(ProductVariantCreate.model_fields)
+UPSERT_COLUMNS = tuple(field for field in PRODUCT_FIELDS if field != "variants") + ("search_text",)
+JSON_FIELDS = ("images", "variants")
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportResult:
+    """Counts and per-row errors of one import."""
+    
+    def __init__(self):
+        self.rows = 0
+        self.upserted = 0
+        self.error_count = 0
+        self.errors = []
+    
+    def add_error(self, line: int, slug, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "slug": slug, "error": message})
+    
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "upserted": self.upserted,
+            "failed": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple]:
+    """Yield (line number, row dict or parse error) from NDJSON or CSV text."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            try:
+                # Empty cells are left out, so they don't overwrite stored values
+                yield reader.line_num, {
+                    key: json.loads(value) if key in JSON_FIELDS else value
+                    for key, value in row.items() if key and value not in ("", None)
+                }
+            except ValueError as exc:
+                yield reader.line_num, exc
+        return
+    
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            yield number, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+        except ValueError as exc:
+            yield number, exc
+
+
+def to_record(row: dict) -> dict:
+    """
+    Validate a row as a product and add its search document.
+    
+    Every row needs the required product fields (slug, both titles and
+    price), but only the fields present in the row are written, so a row
+    without, say, stock, images or variants leaves those as they are;
+    new products get the column defaults. Variants get their schema
+    defaults, except stock, which an existing variant keeps unless the
+    row sets it. The search document is only built when every searchable
+    field is present; otherwise it is refreshed from the stored product
+    after the upsert.
+    """
+    product = ProductCreate.model_validate(row)
+    record = product.model_dump(exclude_unset=True)
+    if "variants" in record:
+        record["variants"] = [variant_fields(variant) for variant in product.variants]
+    if all(field in record for field in SEARCH_FIELDS):
+        record["search_text"] = build_search_document(*(record[field] for field in SEARCH_FIELDS))
+    return record
+
+
+def record_columns(record: dict) -> tuple:
+    return ("id",) + tuple(column for column in UPSERT_COLUMNS if column in record)
+
+
+def copy_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def copy_upsert(db: Session, columns: tuple, records: list):
+    """
+    Upsert records that share `columns` on PostgreSQL by COPYing them into a temp table first.
+    
+    Returns None when the driver can't COPY (e.g. asyncpg under run_sync).
+    """
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        return None
+    
+    names = ", ".join(columns)
+    # Column types only: no NOT NULL, so the row's missing columns can stay empty
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS product_import ON COMMIT DROP "
+        "AS SELECT * FROM products WITH NO DATA"
+    ))
+    db.execute(text("TRUNCATE product_import"))
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([copy_value(record[column]) for column in columns])
+    buffer.seek(0)
+    copy = f"COPY product_import ({names}) FROM STDIN WITH (FORMAT csv)"
+    try:
+        cursor.copy_expert(copy, buffer)
+    except Exception as exc:
+        # Raw cursor errors aren't wrapped by SQLAlchemy; wrap them like any other statement's
+        dbapi = db.get_bind().dialect.loaded_dbapi
+        if isinstance(exc, dbapi.Error):
+            raise DBAPIError.instance(copy, None, exc, dbapi.Error) from exc
+        raise
+    
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+    return db.execute(text(
+        f"INSERT INTO products ({names}) SELECT {names} FROM product_import "
+        f"ON CONFLICT (slug) DO UPDATE SET {updates}, updated_at = now() "
+        "RETURNING id, slug"
+    )).all()
+
+
+def upsert_products(db: Session, records: list) -> list:
+    """
+    Insert or update a chunk of product records by slug; returns (id, slug) rows.
+    
+    Records are written in groups with the same fields, and an update
+    only sets the fields its records carry.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        record.setdefault("id", uuid.uuid4())
+        groups[record_columns(record)].append(record)
+    
+    rows = []
+    for columns, group in groups.items():
+        if db.get_bind().dialect.name == "postgresql":
+            copied = copy_upsert(db, columns, group)
+            if copied is not None:
+                rows.extend(copied)
+                continue
+    
+        statement = upsert(db, Product)
+        statement = statement.on_conflict_do_update(
+            index_elements=["slug"],
+            set_={**{column: statement.excluded[column] for column in columns[1:]}, "updated_at": func.now()}
+        )
+        rows.extend(db.execute(
+            statement.returning(Product.id, Product.slug),
+            [{column: record[column] for column in columns} for record in group]
+        ).all())
+    return rows
+
+
+def refresh_search_text(db: Session, product_ids) -> None:
+    """Rebuild the search document of products updated without all their searchable fields."""
+    if not product_ids:
+        return
+    for product in db.query(Product).filter(Product.id.in_(product_ids)):
+        product.search_text = build_search_document(*(getattr(product, field) for field in SEARCH_FIELDS))
+    db.flush()
+
+
+def apply_chunk(db: Session, chunk: list, result: ImportResult) -> None:
+    """
+    Commit one chunk of (line, record) pairs.
+    
+    If the chunk fails as a whole, its rows are retried one by one so a
+    single bad row only fails itself.
+    """
+    by_slug = {record["slug"]: (line, record) for line, record in chunk}
+    try:
+        rows = upsert_products(db, [record for _, record in by_slug.values()])
+        refresh_search_text(db, [product_id for product_id, slug in rows if "search_text" not in by_slug[slug][1]])
+        replace_variants(db, {
+            product_id: by_slug[slug][1]["variants"]
+            for product_id, slug in rows if "variants" in by_slug[slug][1]
+        })
+        db.commit()
+    except DBAPIError as exc:
+        db.rollback()
+        if len(by_slug) == 1:
+            line, record = next(iter(by_slug.values()))
+            result.add_error(line, record["slug"], str(exc.orig).strip().splitlines()[0])
+            return
+        for item in by_slug.values():
+            apply_chunk(db, [item], result)
+        return
+    
+    result.upserted += len(rows)
+    catalog_cache.delete(*(f"product:{key}" for row in rows for key in row))
+    for product_id, slug in rows:
+        if by_slug[slug][1].get("images"):
+            image_pipeline.submit(product_id)
+
+
+def import_products(db: Session, lines: Iterable[str], fmt: str) -> ImportResult:
+    """
+    Upsert products by slug from NDJSON or CSV lines.
+    
+    Rows are validated one at a time and written `IMPORT_CHUNK_SIZE` at a
+    time, each chunk in its own transaction, so memory stays bounded and
+    a rerun after a failure is safe. Invalid rows are reported with their
+    line number and skipped. Sharded products keep their shard stock.
+    """
+    result = ImportResult()
+    chunk = []
+    for line, row in read_rows(lines, fmt):
+        result.rows += 1
+        if isinstance(row, Exception):
+            result.add_error(line, None, f"Invalid {fmt}: {row}")
+            continue
+        try:
+            chunk.append((line, to_record(row)))
+        except ValidationError as exc:
+            result.add_error(line, row.get("slug"), "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            ))
+            continue
+        if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+            apply_chunk(db, chunk, result)
+            chunk = []
+    if chunk:
+        apply_chunk(db, chunk, result)
+    
+    # Categories may have changed too, so retire every listing
+    if result.upserted:
+        for category in set(db.scalars(select(Product.category).distinct())) | {None}:
+            catalog_cache.bump_generation(category)
+    return result
+
+
+def export_statement():
+    """Product columns in export layout, oldest first; `attach_variants` fills in the variants."""
+    return select(*(
+        null().label(field) if field == "variants" else getattr(Product, field)
+        for field in EXPORT_FIELDS
+    )).order_by(Product.created_at, Product.id)
+
+
+def attach_variants(db: Session, batch) -> list:
+    """Add each product's variants to a batch of export rows with one query."""
+    variants = defaultdict(list)
+    for variant in db.scalars(
+        select(ProductVariant)
+        .where(ProductVariant.product_id.in_([row.id for row in batch]))
+        .order_by(ProductVariant.product_id, ProductVariant.position)
+    ):
+        variants[variant.product_id].append({field: getattr(variant, field) for field in VARIANT_FIELDS})
+    return [
+        tuple(variants[row.id] if field == "variants" else value for field, value in zip(EXPORT_FIELDS, row))
+        for row in batch
+    ]
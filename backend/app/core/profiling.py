@@ -0,0 +1,315 @@
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from app.config import settings
+from app.core.deps import decode_token_cached, load_principal, principal_cache
+from app.core.metrics import current_request
+from app.database import SessionLocal
+
+MAX_STACK_DEPTH = 256
+# Leaf frames of an event loop waiting for I/O (uvloop waits below asyncio.run); those samples are dropped
+IDLE_FRAMES = {("select", "selectors.py"), ("poll", "selectors.py"), ("run", "runners.py")}
+
+
+class Profile:
+    """
+    Samples the stacks of the threads serving one request.
+    
+    The event loop thread is sampled throughout (while it isn't idle),
+    and threadpool threads while they run the request's endpoint, so
+    sync endpoints show up as well as async ones. Samples are written
+    in the speedscope format, one profile per thread.
+    """
+    
+    def __init__(self, name: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.interval = interval
+        self.threads = {threading.get_ident(): "event loop"}
+        self.statements = []  # (SQL, ms), filled by the metrics SQL hooks
+        self.started = None
+        self.duration = None
+        self._frames = {}  # (name, file, line) -> index
+        self._samples = {}  # thread label -> [[frame index, ...], ...]
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.id[:8]}", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+    
+    def _frame_index(self, code) -> int:
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, label in list(self.threads.items()):
+                frame = frames.get(ident)
+                if frame is None or (frame.f_code.co_name, os.path.basename(frame.f_code.co_filename)) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(self._frame_index(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self._samples.setdefault(label, []).append(stack)
+    
+    def speedscope(self, status: Optional[int] = None) -> dict:
+        """The profile as a speedscope file, with the SQL statements issued kept alongside."""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "cosmatic-profiler",
+            "activeProfileIndex": 0,
+            "shared": {
+                "frames": [{"name": name, "file": file, "line": line} for name, file, line in self._frames],
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": label,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": samples,
+                    "weights": [self.interval] * len(samples),
+                }
+                for label, samples in self._samples.items()
+            ],
+            "status": status,
+            "duration_ms": round(self.duration * 1000, 2),
+            "sql": [{"statement": statement, "ms": ms} for statement, ms in self.statements],
+        }
+
+
+# The profile of the request being served, if it is profiled
+active_profile: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+
+def profiled(endpoint):
+    """
+    Let a sync endpoint's threadpool thread be sampled while it serves a profiled request.
+    
+    Already-wrapped endpoints are returned as is, since `include_router`
+    rebuilds routes from the wrapped endpoint.
+    """
+    if getattr(endpoint, "__profiled__", False):
+        return endpoint
+    
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.threads[ident] = "worker"
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.threads.pop(ident, None)
+    
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+class ProfileStore:
+    """The `keep` most recent profiles, as speedscope JSON files in `directory`."""
+    
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+    
+    def paths(self) -> list:
+        return sorted(glob.glob(os.path.join(self.directory, "*.json")), reverse=True)
+    
+    def save(self, profile: Profile, data: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{time.time_ns()}-{profile.id}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+        with self._lock:
+            for stale in self.paths()[self.keep:]:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+    
+    def path(self, profile_id: str) -> Optional[str]:
+        if not profile_id.isalnum():
+            return None
+        matches = glob.glob(os.path.join(self.directory, f"*-{profile_id}.json"))
+        return matches[0] if matches else None
+    
+    def recent(self) -> list:
+        profiles = []
+        for path in self.paths():
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            created, _, profile_id = os.path.basename(path)[:-5].partition("-")
+            profiles.append({
+                "id": profile_id,
+                "name": data["name"],
+                "status": data.get("status"),
+                "duration_ms": data.get("duration_ms"),
+                "sql_statements": len(data.get("sql", ())),
+                "created_at": int(created) / 1e9,
+            })
+        return profiles
+
+
+def load_principal_now(user_id: str):
+    db = SessionLocal()
+    try:
+        return load_principal(db, user_id)
+    finally:
+        db.close()
+
+
+async def is_admin(authorization: str) -> bool:
+    """Check the bearer token through the principal cache; only a miss reads the users table."""
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        user_id = decode_token_cached(authorization[7:])
+    except HTTPException:
+        return False
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = await run_in_threadpool(load_principal_now, user_id)
+    return principal is not None and principal.is_active and principal.is_admin
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests on demand, and optionally 1-in-N per route.
+    
+    An admin request with an `X-Profile` header or a `profile` query
+    parameter is profiled and stored; its `X-Profile-Id` response header
+    names the profile at /api/admin/profiles/{id}. With the value
+    "inline" the profile is returned instead of the response. When
+    `sample_every` is set, every Nth request of each route is profiled
+    into the store as well. Other requests only pay for the flag check.
+    Must run inside MetricsMiddleware, which collects the SQL statements,
+    and inside AdmissionMiddleware, so profiled requests are rate limited.
+    """
+    
+    def __init__(self, app, routes: list, store: ProfileStore, interval: float, sample_every: int):
+        self.app = app
+        self.routes = routes
+        self.store = store
+        self.interval = interval
+        self.sample_every = sample_every
+        self.route_counts = {}
+        self._lock = threading.Lock()
+    
+    def requested(self, scope) -> Optional[str]:
+        """The profiling flag of a request, if it carries one."""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value.decode("latin-1")
+        query_string = scope["query_string"]
+        if b"profile=" in query_string:
+            for pair in query_string.decode("latin-1").split("&"):
+                name, _, value = pair.partition("=")
+                if name == "profile":
+                    return value or "1"
+        return None
+    
+    def sampled(self, scope) -> bool:
+        route = next((route for route in self.routes if route.matches(scope)[0] == Match.FULL), None)
+        key = (scope["method"], route.path if route is not None else "other")
+        with self._lock:
+            count = self.route_counts[key] = self.route_counts.get(key, 0) + 1
+        return count % self.sample_every == 0
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        flag = self.requested(scope)
+        if flag is not None and flag.lower() not in ("0", "false"):
+            authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+            if await is_admin(authorization):
+                await self.profile(scope, receive, send, inline=flag.lower() == "inline")
+                return
+        elif self.sample_every and self.sampled(scope):
+            await self.profile(scope, receive, send, inline=False)
+            return
+        await self.app(scope, receive, send)
+    
+    async def profile(self, scope, receive, send, inline: bool) -> None:
+        profile = Profile(f"{scope['method']} {scope['path']}", self.interval)
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements = profile.statements
+        status = None
+    
+        async def send_profiled(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if inline:
+                    return
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]}
+            elif inline:
+                return
+            await send(message)
+    
+        token = active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            profile.stop()
+            active_profile.reset(token)
+            if stats is not None:
+                stats.statements = None
+            route = scope.get("route")
+            if route is not None:
+                profile.name = f"{scope['method']} {route.path}"
+            data = profile.speedscope(status)
+            await run_in_threadpool(self.store.save, profile, data)
+    
+        if inline:
+            body = json.dumps(data).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-id", profile.id.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+
+profile_store = ProfileStore(directory=settings.PROFILE_DIR, keep=settings.PROFILE_KEEP)
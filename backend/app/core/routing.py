@@ -0,0 +1,67 @@
+import inspect
+import functools
+from fastapi import Depends, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import get_async_db
+from app.core.profiling import profiled
+
+
+def run_on_async_session(endpoint, response_model=None):
+    """
+    Turn a sync endpoint that takes a `Session` into an async one.
+    
+    The handler body runs through `AsyncSession.run_sync`, so its ORM
+    calls are awaited on the event loop by the async driver instead of
+    blocking a worker thread. The response model is validated inside the
+    session as well, so lazy relationships load before it closes.
+    """
+    signature = inspect.signature(endpoint)
+    db_param = next(
+        (name for name, param in signature.parameters.items() if param.annotation is Session),
+        None
+    )
+    if db_param is None or inspect.iscoroutinefunction(endpoint):
+        return endpoint
+    
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+    
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        session: AsyncSession = kwargs.pop(db_param)
+    
+        def call(sync_session: Session):
+            result = endpoint(**kwargs, **{db_param: sync_session})
+            if adapter is not None and not isinstance(result, Response):
+                result = adapter.validate_python(result, from_attributes=True)
+            return result
+    
+        return await session.run_sync(call)
+    
+    wrapper.__signature__ = signature.replace(parameters=[
+        param.replace(annotation=AsyncSession, default=Depends(get_async_db)) if name == db_param else param
+        for name, param in signature.parameters.items()
+    ])
+    return wrapper
+
+
+class SessionRoute(APIRoute):
+    """
+    Route class that serves sync DB endpoints on the async engine when DATABASE_ASYNC is on.
+    
+    Endpoints left on the threadpool are wrapped so profiled requests sample their thread.
+    """
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        if settings.DATABASE_ASYNC:
+            response_model = kwargs.get("response_model")
+            if isinstance(response_model, DefaultPlaceholder):
+                response_model = None
+            endpoint = run_on_async_session(endpoint, response_model)
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,66 @@
+from sqlalchemy import func, literal_column, or_, table, column
+from sqlalchemy.orm import Query, Session
+from app.core.text import tokenize, build_search_document
+from app.models.product import Product, SEARCH_FIELDS
+
+# SQLite FTS5 table maintained by triggers (see app.models.product)
+products_fts = table("products_fts", column("product_id"), column("search_text"))
+
+
+def apply_search(query: Query, term: str):
+    """
+    Filter a product query by a search term.
+    
+    Returns the filtered query and an ORDER BY clause ranking the
+    matches by relevance, or None if the term has no searchable words.
+    """
+    terms = tokenize(term)
+    if not terms:
+        return query, None
+    
+    dialect = query.session.get_bind().dialect.name
+    
+    if dialect == "postgresql":
+        document = func.to_tsvector(literal_column("'simple'"), func.coalesce(Product.search_text, literal_column("''")))
+        ts_query = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{t}:*" for t in terms))
+        query = query.filter(
+            or_(
+                document.op("@@")(ts_query),
+                Product.search_text.ilike(f"%{' '.join(terms)}%")
+            )
+        )
+        return query, func.ts_rank(document, ts_query).desc()
+    
+    if dialect == "sqlite":
+        match = " ".join(f'"{t}"*' for t in terms)
+        query = query.join(products_fts, products_fts.c.product_id == Product.id).filter(
+            literal_column("products_fts").op("MATCH")(match)
+        )
+        return query, func.bm25(literal_column("products_fts")).asc()
+    
+    # Other backends: substring match on the normalized document
+    for t in terms:
+        query = query.filter(Product.search_text.ilike(f"%{t}%"))
+    return query, None
+
+
+def rebuild_search_index(db: Session) -> int:
+    """Recompute the search document for every product."""
+    count = 0
+    for product in db.query(Product).yield_per(500):
+        product.search_text = build_search_document(
+            *(getattr(product, field) for field in SEARCH_FIELDS)
+        )
+        count += 1
+    db.commit()
+    
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(products_fts.delete())
+        db.execute(
+            products_fts.insert().from_select(
+                ["product_id", "search_text"],
+                db.query(Product.id, Product.search_text).statement
+            )
+        )
+        db.commit()
+    return count
@@ -0,0 +1,22 @@
+from decimal import Decimal
+import orjson
+from fastapi.responses import Response
+
+# Match Pydantic's JSON output ("Z" for UTC)
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    """Serialize with orjson; Decimals become strings like Pydantic's."""
+    return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+
+
+class RawJSONResponse(Response):
+    """Response for a body that is already serialized JSON."""
+    media_type = "application/json"
@@ -0,0 +1,223 @@
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from sqlalchemy.engine import Engine
+from sqlalchemy import event
+from app.config import settings
+from app.core.metrics import current_request
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(APP_DIR)
+# Frames from these files are plumbing, not the code that issued the query
+PLUMBING = (os.path.abspath(__file__), os.path.join(APP_DIR, "database.py"), os.path.join(APP_DIR, "core", "metrics.py"))
+
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+MAX_PARAMETER_SHAPES = 20
+
+PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize(statement: str) -> str:
+    """SQL with literals and placeholders as `?` and IN lists collapsed, so repeats of a query compare equal."""
+    sql = PLACEHOLDER.sub("?", statement)
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    sql = VALUE_LIST.sub("(?, ...)", sql)
+    return " ".join(sql.split())
+
+
+def value_shape(value) -> str:
+    name = type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{name}[{len(value)}]"
+    return name
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Types (and lengths) of bound parameters; values are never logged."""
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        items = list(parameters.items())
+        shape = {name: value_shape(value) for name, value in items[:MAX_PARAMETER_SHAPES]}
+        if len(items) > MAX_PARAMETER_SHAPES:
+            shape["..."] = f"{len(items) - MAX_PARAMETER_SHAPES} more"
+        return shape
+    if isinstance(parameters, (list, tuple)):
+        shape = [value_shape(value) for value in parameters[:MAX_PARAMETER_SHAPES]]
+        if len(parameters) > MAX_PARAMETER_SHAPES:
+            shape.append(f"... {len(parameters) - MAX_PARAMETER_SHAPES} more")
+        return shape
+    return value_shape(parameters)
+
+
+def caller_stack(limit: int) -> list:
+    """The innermost `limit` frames of application code that led to the query."""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(APP_DIR) and frame.filename not in PLUMBING
+    ]
+    return [
+        f"{os.path.relpath(frame.filename, ROOT_DIR)}:{frame.lineno} in {frame.name}"
+        for frame in frames[-limit:]
+    ]
+
+
+def current_route() -> str:
+    stats = current_request.get()
+    if stats is None:
+        return "background"
+    scope = stats.scope
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class SlowQueryLog:
+    """
+    Log statements slower than `threshold_ms` with where they came from.
+    
+    Each slow statement is logged with its normalized SQL, parameter
+    shapes, route and caller stack, and kept among the `keep` most
+    recent. A sample of slow reads (`explain_rate`, and each query at
+    most once per `explain_interval` seconds) is explained on a
+    background thread, so the request that ran it never waits for the
+    plan. Plans are captured for the sync engine only: statements from
+    the async engine use its driver's placeholders.
+    """
+    
+    def __init__(self, threshold_ms: float, explain_rate: float, explain_interval: float,
+                 max_queued: int, keep: int, stack_depth: int):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.stack_depth = stack_depth
+        self.recent = deque(maxlen=keep)
+        self.logged = 0
+        self.explained = 0
+        self.explain_dropped = 0
+        self.explain_errors = 0
+        self._explained_at = OrderedDict()  # normalized SQL -> time of its last plan
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def instrument(self, engine: Engine, explain: bool = True) -> None:
+        prefix = EXPLAIN_PREFIXES.get(engine.dialect.name) if explain else None
+    
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+    
+        @event.listens_for(engine, "after_cursor_execute")
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["slow_query_started"].pop()
+            if elapsed >= self.threshold and not conn.get_execution_options().get("explaining"):
+                self.record(engine, prefix, statement, parameters, executemany, elapsed)
+    
+        @event.listens_for(engine, "handle_error")
+        def failed_query(context):
+            started = context.connection.info.get("slow_query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+    
+    def record(self, engine: Engine, prefix, statement: str, parameters, executemany: bool, elapsed: float) -> None:
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "ms": round(elapsed * 1000, 2),
+            "sql": normalize(statement),
+            "parameters": parameter_shape(parameters, executemany),
+            "route": current_route(),
+            "stack": caller_stack(self.stack_depth),
+            "plan": None,
+        }
+        with self._lock:
+            self.logged += 1
+            self.recent.append(entry)
+        logger.warning(
+            "Slow query (%.1f ms) from %s: %s params=%s at %s",
+            entry["ms"], entry["route"], entry["sql"], entry["parameters"], " <- ".join(reversed(entry["stack"]))
+        )
+        if prefix and not executemany and self._should_explain(entry["sql"]):
+            try:
+                self._queue.put_nowait((engine, prefix, statement, parameters, entry))
+            except queue.Full:
+                self.explain_dropped += 1
+    
+    def _should_explain(self, sql: str) -> bool:
+        if not sql.upper().startswith(("SELECT", "WITH")) or random.random() >= self.explain_rate:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(sql)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._explained_at[sql] = now
+            self._explained_at.move_to_end(sql)
+            while len(self._explained_at) > self.recent.maxlen:
+                self._explained_at.popitem(last=False)
+        return True
+    
+    def explain(self, engine: Engine, prefix: str, statement: str, parameters, entry: dict) -> None:
+        with engine.connect().execution_options(explaining=True) as conn:
+            rows = conn.exec_driver_sql(prefix + statement, parameters or ()).all()
+        entry["plan"] = [str(row[-1]) for row in rows]
+        self.explained += 1
+        logger.warning("Plan for slow query %s:\n  %s", entry["sql"], "\n  ".join(entry["plan"]))
+    
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self.explain(*job)
+            except Exception:
+                self.explain_errors += 1
+                logger.warning("Could not explain slow query", exc_info=True)
+    
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def stats(self) -> dict:
+        with self._lock:
+            recent = list(self.recent)
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "logged": self.logged,
+            "explained": self.explained,
+            "explain_queued": self._queue.qsize(),
+            "explain_dropped": self.explain_dropped,
+            "explain_errors": self.explain_errors,
+            "recent": recent[::-1],
+        }
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_MS,
+    explain_rate=settings.SLOW_QUERY_EXPLAIN_RATE,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL,
+    max_queued=settings.SLOW_QUERY_MAX_QUEUED,
+    keep=settings.SLOW_QUERY_KEEP,
+    stack_depth=settings.SLOW_QUERY_STACK_DEPTH
+) if settings.SLOW_QUERY_LOG else None
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Callable, Iterator, Optional, Sequence
+from uuid import UUID
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.database import SessionLocal
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def plain_value(value):
+    """Convert a column value to something json/csv can write."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def stream_rows(statement, fields: Sequence[str], fmt: str, transform: Optional[Callable] = None) -> Iterator[str]:
+    """
+    Run `statement` on a server-side cursor and yield it as NDJSON or CSV.
+    
+    Rows are fetched `EXPORT_BATCH_SIZE` at a time and each batch is
+    written out as one chunk, so memory stays flat whatever the row count.
+    `transform(db, batch)` may rewrite each batch before it is written.
+    The generator owns its session, since it outlives the request handler.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+        for batch in result.partitions():
+            if transform is not None:
+                batch = transform(db, batch)
+            if fmt == "csv":
+                for row in batch:
+                    writer.writerow([
+                        json.dumps(value, default=plain_value) if isinstance(value, (list, dict)) else plain_value(value)
+                        for value in row
+                    ])
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                chunk = "".join(
+                    json.dumps(dict(zip(fields, map(plain_value, row))), ensure_ascii=False, default=plain_value) + "\n"
+                    for row in batch
+                )
+            yield chunk
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def streaming_export(
+    statement, fields: Sequence[str], fmt: str, name: str, transform: Optional[Callable] = None
+) -> StreamingResponse:
+    """Stream `statement` as a `name.<fmt>` download."""
+    return StreamingResponse(
+        stream_rows(statement, fields, fmt, transform),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    )
@@ -0,0 +1,34 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs `fn` every `interval` seconds on a daemon thread until stopped."""
+    
+    def __init__(self, name: str, fn, interval: float):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+    
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
@@ -0,0 +1,37 @@
+import re
+from typing import Optional
+
+# Arabic short vowels, tanween, shadda, sukun, superscript alef and tatweel
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+
+ARABIC_LETTER_MAP = str.maketrans({
+    "آ": "ا",  # alef with madda -> alef
+    "أ": "ا",  # alef with hamza above -> alef
+    "إ": "ا",  # alef with hamza below -> alef
+    "ٱ": "ا",  # alef wasla -> alef
+    "ى": "ي",  # alef maksura -> yaa
+    "ئ": "ي",  # yaa with hamza -> yaa
+    "ؤ": "و",  # waw with hamza -> waw
+    "ة": "ه",  # taa marbuta -> haa
+})
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Normalize bilingual text for indexing and matching."""
+    if not value:
+        return ""
+    value = ARABIC_DIACRITICS.sub("", value)
+    value = value.translate(ARABIC_LETTER_MAP)
+    return " ".join(value.lower().split())
+
+
+def tokenize(value: Optional[str]) -> list:
+    """Split normalized text into search terms."""
+    return WORD_PATTERN.findall(normalize_text(value))
+
+
+def build_search_document(*parts: Optional[str]) -> str:
+    """Build the normalized search document for a set of fields."""
+    return " ".join(normalize_text(part) for part in parts if part)
@@ -0,0 +1,17 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def upsert(db: Session, model):
+    """
+    Return an INSERT for `model` that supports ON CONFLICT clauses.
+    
+    PostgreSQL and SQLite share the `on_conflict_do_update` /
+    `on_conflict_do_nothing` API, so callers don't branch on the dialect.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
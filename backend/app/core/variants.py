@@ -0,0 +1,85 @@
+import uuid
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from app.core.upsert import upsert
+from app.models.product import Product, ProductVariant
+from app.schemas.product import ProductVariantCreate
+
+# Columns a variant list write may change on an existing variant
+VARIANT_COLUMNS = ("name_en", "name_ar", "sku", "price", "stock_quantity", "position", "is_active")
+
+
+def variant_value(data: dict) -> str:
+    """Filter key of a variant: its `value`, or else its English name, lowercased."""
+    return (data.get("value") or data["name_en"]).strip().lower()
+
+
+def variant_fields(variant: ProductVariantCreate) -> dict:
+    """A variant's fields for replace_variants, defaults included; stock only when the payload sets it."""
+    exclude = None if "stock_quantity" in variant.model_fields_set else {"stock_quantity"}
+    return variant.model_dump(exclude=exclude)
+
+
+def unit_price(product: Product, variant: Optional[ProductVariant]) -> Decimal:
+    """Price of one unit of a product, or of one of its variants."""
+    if variant is not None and variant.price is not None:
+        return variant.price
+    return product.price
+
+
+def replace_variants(db: Session, variants_by_product: dict) -> None:
+    """
+    Make each product's variants exactly the given lists.
+    
+    Variants are matched on (type, value), so unchanged variants keep
+    their ids (and the cart lines pointing at them); missing ones are
+    deleted and new ones inserted, with one upsert for all products.
+    A repeated (type, value) in a list keeps its last entry. An existing
+    variant keeps its stock unless its entry sets `stock_quantity`.
+    """
+    if not variants_by_product:
+        return
+    
+    rows = {}
+    for product_id, variants in variants_by_product.items():
+        for position, variant in enumerate(variants):
+            row = {
+                "id": uuid.uuid4(),
+                "product_id": product_id,
+                "type": variant["type"],
+                "value": variant_value(variant),
+                "name_en": variant["name_en"],
+                "name_ar": variant["name_ar"],
+                "sku": variant.get("sku"),
+                "price": variant.get("price"),
+                "position": position,
+                "is_active": variant.get("is_active", True),
+            }
+            if variant.get("stock_quantity") is not None:
+                row["stock_quantity"] = variant["stock_quantity"]
+            rows[(product_id, row["type"], row["value"])] = row
+    
+    stale = db.query(ProductVariant).filter(ProductVariant.product_id.in_(variants_by_product))
+    if rows:
+        key = tuple_(ProductVariant.product_id, ProductVariant.type, ProductVariant.value)
+        stale = stale.filter(~key.in_(list(rows)))
+    stale.delete(synchronize_session=False)
+    
+    # Rows with and without stock take separate upserts, as each statement updates a fixed column list
+    for with_stock in (True, False):
+        group = [row for row in rows.values() if ("stock_quantity" in row) == with_stock]
+        if not group:
+            continue
+        columns = [column for column in VARIANT_COLUMNS if with_stock or column != "stock_quantity"]
+        statement = upsert(db, ProductVariant)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["product_id", "type", "value"],
+            set_={**{column: statement.excluded[column] for column in columns}, "updated_at": func.now()}
+        ), group)
+    
+    # Drop loaded variant collections so they reload with the new rows
+    for product in db.identity_map.values():
+        if isinstance(product, Product) and product.id in variants_by_product:
+            db.expire(product, ["variants"])
@@ -1,18 +1,50 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.core.metrics import instrument_engine
+from app.core.slow_queries import slow_query_log
 
 # Create database engine with SQLite support
 connect_args = {}
 if settings.DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, pool_pre_ping=True)
+engine = create_engine(
+    settings.DATABASE_URL,
+    connect_args=connect_args,
+    pool_pre_ping=True,
+    pool_timeout=settings.DB_POOL_TIMEOUT
+)
+
+instrument_engine(engine, "sync")
+if slow_query_log is not None:
+    slow_query_log.instrument(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (asyncpg / aiosqlite) used by routes when DATABASE_ASYNC is on
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    if settings.ASYNC_DATABASE_URL:
+        async_url = make_url(settings.ASYNC_DATABASE_URL)
+    else:
+        async_url = make_url(settings.DATABASE_URL)
+        async_url = async_url.set(drivername=ASYNC_DRIVERS[async_url.get_backend_name()])
+    # aiosqlite runs on a NullPool, which takes no pool_timeout
+    pool_args = {} if async_url.get_backend_name() == "sqlite" else {"pool_timeout": settings.DB_POOL_TIMEOUT}
+    async_engine = create_async_engine(async_url, pool_pre_ping=True, **pool_args)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False)
+    instrument_engine(async_engine.sync_engine, "async")
+    if slow_query_log is not None:
+        slow_query_log.instrument(async_engine.sync_engine, explain=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -24,3 +56,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
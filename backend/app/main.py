@@ -1,26 +1,84 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import hmac
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
 from app.config import settings
-from app.database import Base, engine
+from app.database import Base, engine, async_engine
 from app.api.auth import router as auth_router
 from app.api.products import router as products_router
 from app.api.cart import router as cart_router
 from app.api.orders import router as orders_router
 from app.api.wishlist import router as wishlist_router
 from app.api.admin import router as admin_router
+from app.api.images import router as images_router
+from app.api.payments import router as payments_router
+from app.core.hashing import password_hasher
+from app.core.inventory import reservation_sweeper
+from app.core.images import image_pipeline
+from app.core.outbox import outbox_worker
+from app.core.slow_queries import slow_query_log
+from app.core.conditional import ConditionalGetMiddleware
+from app.core.admission import AdmissionMiddleware, concurrency_limiter, rate_limiter
+from app.core import metrics
+from app.core.profiling import ProfilingMiddleware, profile_store
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Run background tasks and shut down worker pools on exit
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reservation_sweeper.start()
+    image_pipeline.start()
+    outbox_worker.start()
+    if slow_query_log is not None:
+        slow_query_log.start()
+    yield
+    reservation_sweeper.stop()
+    image_pipeline.stop()
+    outbox_worker.stop()
+    if slow_query_log is not None:
+        slow_query_log.stop()
+    password_hasher.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Cosmatic E-commerce API",
     description="Backend API for Cosmatic cosmetics e-commerce platform",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Admin-requested and sampled request profiles, inside admission control
+app.add_middleware(
+    ProfilingMiddleware,
+    routes=app.router.routes,
+    store=profile_store,
+    interval=settings.PROFILE_INTERVAL,
+    sample_every=settings.PROFILE_SAMPLE_EVERY
 )
 
+# Rate limits and load shedding, inside CORS so 429/503s stay readable by the storefront
+app.add_middleware(AdmissionMiddleware, limiter=rate_limiter, concurrency=concurrency_limiter)
+
+# An exhausted connection pool answers fast instead of queueing requests
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -28,8 +86,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset cursors of paginated lists travel in a header the storefront must read
+    expose_headers=["X-Next-Cursor"],
 )
 
+# ETags and 304s for GET responses
+app.add_middleware(ConditionalGetMiddleware)
+
+# Compress large responses, with brotli when `brotli-asgi` is installed
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Outermost, so shed and rate-limited requests are measured too
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Health check endpoints
 @app.get("/")
 def read_root():
@@ -43,6 +116,15 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Prometheus metrics: route latency and status, SQL work per request, pool state."""
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include API routers
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(products_router, prefix="/api/products", tags=["Products"])
@@ -50,3 +132,8 @@ app.include_router(cart_router, prefix="/api/cart", tags=["Cart"])
 app.include_router(orders_router, prefix="/api/orders", tags=["Orders"])
 app.include_router(wishlist_router, prefix="/api/wishlist", tags=["Wishlist"])
 app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
+app.include_router(images_router, prefix="/api/images", tags=["Images"])
+app.include_router(payments_router, prefix="/api/payments", tags=["Payments"])
+
+# Locally stored product image originals
+app.mount(settings.MEDIA_URL.rstrip("/"), StaticFiles(directory=settings.MEDIA_ROOT, check_dir=False), name="media")
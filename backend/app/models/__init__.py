@@ -1,16 +1,23 @@
 # Import all models to ensure they are registered with SQLAlchemy
 from app.models.user import User
-from app.models.product import Product
+from app.models.product import Product, ProductVariant
 from app.models.cart import CartItem
 from app.models.wishlist import Wishlist
 from app.models.order import Order, OrderItem, OrderStatus
+from app.models.inventory import StockShard, StockReservation
+from app.models.outbox import OutboxEvent, OutboxStatus
 
 __all__ = [
     "User",
     "Product",
+    "ProductVariant",
     "CartItem",
     "Wishlist",
     "Order",
     "OrderItem",
     "OrderStatus",
+    "StockShard",
+    "StockReservation",
+    "OutboxEvent",
+    "OutboxStatus",
 ]
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -8,11 +8,19 @@ from app.database import Base
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # One row per (user, product, variant); NULL variants compare equal
+        Index(
+            "uq_cart_items_user_product_variant",
+            "user_id", "product_id", text("coalesce(CAST(variant_id AS VARCHAR), '')"),
+            unique=True
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
-    variant_id = Column(String, nullable=True)  # Reference to specific variant
+    variant_id = Column(UUID(as_uuid=True), ForeignKey("product_variants.id", ondelete="CASCADE"), nullable=True)
     quantity = Column(Integer, default=1, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -20,6 +28,11 @@ class CartItem(Base):
     # Relationships
     user = relationship("User", backref="cart_items")
     product = relationship("Product", backref="cart_items")
+    variant = relationship("ProductVariant")
     
     def __repr__(self):
         return f"<CartItem user={self.user_id} product={self.product_id}>"
+
+
+# Conflict target matching uq_cart_items_user_product_variant
+CART_ITEM_KEY = [CartItem.user_id, CartItem.product_id, text("coalesce(CAST(variant_id AS VARCHAR), '')")]
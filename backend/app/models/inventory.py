@@ -0,0 +1,34 @@
+import uuid
+from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class StockShard(Base):
+    """A slice of a hot product's stock, so buyers don't all lock one row."""
+    __tablename__ = "stock_shards"
+    
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<StockShard product={self.product_id} shard={self.shard}>"
+
+
+class StockReservation(Base):
+    """Stock held for a pending order until it is paid or expires."""
+    __tablename__ = "stock_reservations"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    variant_id = Column(UUID(as_uuid=True), ForeignKey("product_variants.id", ondelete="CASCADE"), nullable=True)
+    shard = Column(Integer, nullable=True)  # Set when taken from a stock shard
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<StockReservation order={self.order_id} product={self.product_id}>"
@@ -0,0 +1,36 @@
+import uuid
+import enum
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class OutboxStatus(str, enum.Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"  # gave up after OUTBOX_MAX_ATTEMPTS
+
+
+class OutboxEvent(Base):
+    """A side effect recorded in the transaction that caused it, run later by the outbox worker."""
+    __tablename__ = "outbox_events"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    topic = Column(String, nullable=False)
+    key = Column(String, unique=True, nullable=True)  # Dedupes events delivered twice, e.g. webhooks
+    payload = Column(JSON, nullable=False)
+    status = Column(SQLEnum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime(timezone=True), nullable=False)  # Next attempt, or end of a worker's lease
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        # Workers claim the oldest due pending events
+        Index("ix_outbox_events_status_available_at", "status", "available_at"),
+    )
+    
+    def __repr__(self):
+        return f"<OutboxEvent {self.topic} {self.status.value}>"
@@ -1,9 +1,15 @@
 import uuid
 from decimal import Decimal
-from sqlalchemy import Column, String, Numeric, Boolean, DateTime, Text, JSON
+from sqlalchemy import (
+    Column, String, Numeric, Integer, Boolean, DateTime, Text, JSON, ForeignKey, Index, UniqueConstraint, DDL, event, text, true
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
 from app.database import Base
+from app.core.text import build_search_document
+
+SEARCH_FIELDS = ("title_en", "title_ar", "description_en", "description_ar")
 
 
 class Product(Base):
@@ -19,12 +25,107 @@ class Product(Base):
     slug = Column(String, unique=True, index=True, nullable=False)
     category = Column(String, nullable=True)
     brand = Column(String, nullable=True)
-    stock_quantity = Column(Numeric(10, 0), default=0)
+    # Server defaults too, for rows inserted by the bulk import's raw INSERT
+    stock_quantity = Column(Integer, default=0, server_default="0", nullable=False)
+    stock_shards = Column(Integer, default=0, server_default="0", nullable=False)  # >0 keeps stock in stock_shards
     images = Column(JSON, nullable=True)  # Array of image URLs
-    variants = Column(JSON, nullable=True)  # Product variants (size, shade, etc.)
-    is_active = Column(Boolean, default=True)
+    srcset = Column(JSON, nullable=True)  # {image URL: {format: srcset}}, written by the image pipeline
+    legacy_variants = Column("variants", JSON, nullable=True)  # Pre-product_variants JSON, read by the migration
+    is_active = Column(Boolean, default=True, server_default=true())
+    search_text = Column(Text, nullable=True)  # Normalized bilingual search document
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Keyset pagination sort keys
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        # Postgres full-text and trigram indexes over the search document
+        Index(
+            "ix_products_search_tsv",
+            text("to_tsvector('simple', coalesce(search_text, ''))"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_search_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+    
+    # Variants are batch-loaded with any product query
+    variants = relationship(
+        "ProductVariant",
+        back_populates="product",
+        order_by="ProductVariant.position",
+        cascade="all, delete-orphan",
+        lazy="selectin"
+    )
+    
     def __repr__(self):
         return f"<Product {self.title_en}>"
+
+
+class ProductVariant(Base):
+    __tablename__ = "product_variants"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    type = Column(String, nullable=False)  # shade, size, scent
+    value = Column(String, nullable=False)  # Lowercase filter key, e.g. "rose nude" or "50ml"
+    name_en = Column(String, nullable=False)
+    name_ar = Column(String, nullable=False)
+    sku = Column(String, nullable=True, index=True)
+    price = Column(Numeric(10, 2), nullable=True)  # Overrides the product price when set
+    stock_quantity = Column(Integer, default=0, nullable=False)
+    position = Column(Integer, default=0, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    legacy_id = Column(String, nullable=True)  # Id from the old JSON column
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        # Natural key used to upsert a product's variant list
+        UniqueConstraint("product_id", "type", "value", name="uq_product_variants_product_type_value"),
+        # Attribute filters on the catalog, e.g. every product with a "berry" shade
+        Index("ix_product_variants_type_value_product", "type", "value", "product_id"),
+    )
+    
+    # Relationships
+    product = relationship("Product", back_populates="variants")
+    
+    def __repr__(self):
+        return f"<ProductVariant {self.type}={self.value} product={self.product_id}>"
+
+
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def update_search_text(mapper, connection, target):
+    """Keep the search document in sync with the searchable fields."""
+    target.search_text = build_search_document(
+        *(getattr(target, field) for field in SEARCH_FIELDS)
+    )
+
+
+# Trigram operator class used by ix_products_search_trgm
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+# SQLite FTS5 index, kept in sync with products by triggers
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "product_id UNINDEXED, search_text)",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts (product_id, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF search_text ON products BEGIN "
+    "DELETE FROM products_fts WHERE product_id = old.id; "
+    "INSERT INTO products_fts (product_id, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN "
+    "DELETE FROM products_fts WHERE product_id = old.id; END",
+)
+for statement in SQLITE_FTS_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
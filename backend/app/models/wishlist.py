@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, DateTime
+from sqlalchemy import Column, ForeignKey, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -8,6 +8,10 @@ from app.database import Base
 
 class Wishlist(Base):
     __tablename__ = "wishlist"
+    __table_args__ = (
+        Index("uq_wishlist_user_product", "user_id", "product_id", unique=True),
+        Index("ix_wishlist_user_created_at_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -1,11 +1,13 @@
-from app.schemas.user import UserCreate, UserLogin, UserUpdate, UserResponse, Token
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductList
-from app.schemas.cart import CartItemCreate, CartItemUpdate, CartItemResponse, CartResponse
-from app.schemas.order import OrderCreate, OrderResponse, OrderStatusUpdate, ShippingAddress
+from app.schemas.user import UserCreate, UserLogin, UserUpdate, UserResponse, Token, Principal
+from app.schemas.product import ProductVariantCreate, ProductVariantResponse, ProductCreate, ProductUpdate, ProductResponse, ProductList, FacetCount, PriceRange, ProductFacets
+from app.schemas.cart import CartItemCreate, CartItemUpdate, CartBatchOperation, CartBatch, CartItemResponse, CartResponse
+from app.schemas.wishlist import WishlistBulk, WishlistMembership
+from app.schemas.order import OrderCreate, OrderSummary, OrderResponse, OrderStatusUpdate, ShippingAddress
 
 __all__ = [
-    "UserCreate", "UserLogin", "UserUpdate", "UserResponse", "Token",
-    "ProductCreate", "ProductUpdate", "ProductResponse", "ProductList",
-    "CartItemCreate", "CartItemUpdate", "CartItemResponse", "CartResponse",
-    "OrderCreate", "OrderResponse", "OrderStatusUpdate", "ShippingAddress",
+    "UserCreate", "UserLogin", "UserUpdate", "UserResponse", "Token", "Principal",
+    "ProductVariantCreate", "ProductVariantResponse", "ProductCreate", "ProductUpdate", "ProductResponse", "ProductList", "FacetCount", "PriceRange", "ProductFacets",
+    "CartItemCreate", "CartItemUpdate", "CartBatchOperation", "CartBatch", "CartItemResponse", "CartResponse",
+    "WishlistBulk", "WishlistMembership",
+    "OrderCreate", "OrderSummary", "OrderResponse", "OrderStatusUpdate", "ShippingAddress",
 ]
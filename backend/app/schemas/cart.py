@@ -1,15 +1,15 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime
-from app.schemas.product import ProductResponse
+from app.schemas.product import ProductResponse, ProductVariantResponse
 
 
 class CartItemBase(BaseModel):
     product_id: UUID
-    variant_id: Optional[str] = None
-    quantity: int = 1
+    variant_id: Optional[UUID] = None
+    quantity: int = Field(1, ge=1)
 
 
 class CartItemCreate(CartItemBase):
@@ -20,11 +20,23 @@ class CartItemUpdate(BaseModel):
     quantity: int
 
 
+class CartBatchOperation(BaseModel):
+    op: Literal["add", "set", "remove"]  # add to, replace or drop a line's quantity
+    product_id: UUID
+    variant_id: Optional[UUID] = None
+    quantity: int = Field(1, ge=0)  # `add` needs at least 1, checked when the batch is folded
+
+
+class CartBatch(BaseModel):
+    operations: List[CartBatchOperation] = Field(..., max_length=200)
+
+
 class CartItemResponse(BaseModel):
     id: UUID
     product_id: UUID
     product: ProductResponse
-    variant_id: Optional[str] = None
+    variant_id: Optional[UUID] = None
+    variant: Optional[ProductVariantResponse] = None
     quantity: int
     created_at: datetime
     
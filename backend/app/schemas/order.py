@@ -27,7 +27,7 @@ class ShippingAddress(BaseModel):
 class OrderItemResponse(BaseModel):
     id: UUID
     product_id: UUID
-    variant_id: Optional[str] = None
+    variant_id: Optional[UUID] = None
     quantity: int
     price_at_purchase: Decimal
     
@@ -39,13 +39,12 @@ class OrderCreate(BaseModel):
     shipping_address: ShippingAddress
 
 
-class OrderResponse(BaseModel):
+class OrderSummary(BaseModel):
     id: UUID
     order_number: str
     status: OrderStatus
     total_amount: Decimal
     shipping_address: Any
-    items: List[OrderItemResponse]
     payment_id: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -54,5 +53,9 @@ class OrderResponse(BaseModel):
         from_attributes = True
 
 
+class OrderResponse(OrderSummary):
+    items: List[OrderItemResponse]
+
+
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
@@ -1,10 +1,33 @@
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime
 
 
+class ProductVariantBase(BaseModel):
+    type: str = "shade"  # shade, size, scent
+    name_en: str
+    name_ar: str
+    value: Optional[str] = None  # Filter key; defaults to the lowercased English name
+    sku: Optional[str] = None
+    price: Optional[Decimal] = None  # Falls back to the product price
+    stock_quantity: int = 0
+    is_active: bool = True
+
+
+class ProductVariantCreate(ProductVariantBase):
+    pass
+
+
+class ProductVariantResponse(ProductVariantBase):
+    id: UUID
+    value: str
+    
+    class Config:
+        from_attributes = True
+
+
 class ProductBase(BaseModel):
     title_en: str
     title_ar: str
@@ -17,7 +40,7 @@ class ProductBase(BaseModel):
     brand: Optional[str] = None
     stock_quantity: int = 0
     images: Optional[List[str]] = []
-    variants: Optional[List[Any]] = []
+    variants: List[ProductVariantCreate] = []
     is_active: bool = True
 
 
@@ -36,12 +59,15 @@ class ProductUpdate(BaseModel):
     brand: Optional[str] = None
     stock_quantity: Optional[int] = None
     images: Optional[List[str]] = None
-    variants: Optional[List[Any]] = None
+    variants: Optional[List[ProductVariantCreate]] = None  # Replaces the whole list when set
     is_active: Optional[bool] = None
 
 
 class ProductResponse(ProductBase):
     id: UUID
+    variants: List[ProductVariantResponse] = []
+    srcset: Optional[Dict[str, Dict[str, str]]] = None  # Resized copies per image, once rendered
+    stock_shards: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -51,6 +77,25 @@ class ProductResponse(ProductBase):
 
 class ProductList(BaseModel):
     items: List[ProductResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # None when count="none"
+    has_more: bool = False
+    page: Optional[int] = None  # None in cursor mode
     per_page: int
+    next_cursor: Optional[str] = None
+
+
+class FacetCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+
+class PriceRange(BaseModel):
+    min: Optional[Decimal] = None
+    max: Optional[Decimal] = None
+
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[FacetCount]
+    brands: List[FacetCount]
+    price: PriceRange
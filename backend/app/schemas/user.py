@@ -41,3 +41,13 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
+
+
+class Principal(BaseModel):
+    """Authenticated identity and flags, cached between requests."""
+    id: UUID
+    is_admin: bool
+    is_active: bool
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import List
+from uuid import UUID
+
+
+class WishlistBulk(BaseModel):
+    add: List[UUID] = Field([], max_length=200)
+    remove: List[UUID] = Field([], max_length=200)
+
+
+class WishlistMembership(BaseModel):
+    product_ids: List[UUID]  # The requested products that are in the wishlist
@@ -0,0 +1,98 @@
+"""
+Hammer one product with concurrent single-unit checkouts.
+
+Usage: python -m scripts.bench_stock --stock 500 --buyers 1000 --threads 32 --shards 8
+
+Prints how many reservations succeeded and checks that no more units
+were sold than were in stock.
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.database import Base, SessionLocal, engine
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+from app.models.user import User
+from app.models.inventory import StockReservation
+from app.core.inventory import reserve_stock, set_stock_shards, sync_sharded_stock
+
+
+def setup(stock: int, shards: int):
+    db = SessionLocal()
+    try:
+        user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", password_hash="-")
+        product = Product(
+            title_en="Bench product",
+            title_ar="Bench product",
+            price=1,
+            slug=f"bench-{uuid.uuid4().hex[:8]}",
+            stock_quantity=stock
+        )
+        db.add_all([user, product])
+        db.flush()
+        set_stock_shards(db, product, shards)
+        db.commit()
+        return user.id, product.id
+    finally:
+        db.close()
+
+
+def buy(user_id, product_id) -> bool:
+    db = SessionLocal()
+    try:
+        product = db.get(Product, product_id)
+        order = Order(
+            user_id=user_id,
+            order_number=f"BENCH-{uuid.uuid4().hex[:8].upper()}",
+            status=OrderStatus.PENDING,
+            total_amount=product.price,
+            shipping_address={}
+        )
+        db.add(order)
+        db.flush()
+        reserve_stock(db, order.id, [(product, None, 1)])
+        db.commit()
+        return True
+    except HTTPException:
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--buyers", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--shards", type=int, default=0)
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine)
+    user_id, product_id = setup(args.stock, args.shards)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda _: buy(user_id, product_id), range(args.buyers)))
+    elapsed = time.perf_counter() - started
+    
+    db = SessionLocal()
+    try:
+        sync_sharded_stock(db)
+        db.commit()
+        remaining = db.get(Product, product_id).stock_quantity
+        reserved = db.query(StockReservation).filter(StockReservation.product_id == product_id).count()
+    finally:
+        db.close()
+    
+    sold = sum(results)
+    print(f"sold {sold}/{args.buyers} in {elapsed:.2f}s ({args.buyers / elapsed:.0f} checkouts/s)")
+    print(f"remaining stock {remaining}, reservations {reserved}")
+    assert sold == reserved == args.stock - remaining, "stock and reservations disagree"
+    assert remaining >= 0, "oversold"
+
+
+if __name__ == "__main__":
+    main()
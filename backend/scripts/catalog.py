@@ -0,0 +1,58 @@
+"""
+Bulk import or export the product catalog, or rebuild its search index.
+
+Usage:
+    python -m scripts.catalog import products.ndjson
+    python -m scripts.catalog import products.csv --format csv
+    python -m scripts.catalog export --format csv > products.csv
+    python -m scripts.catalog reindex
+
+Run `reindex` once after deploying search (and after restoring a
+database dump): products written before then have no search document,
+so search never returns them.
+"""
+import argparse
+import json
+import sys
+from app.database import Base, SessionLocal, engine
+from app.core.product_import import EXPORT_FIELDS, attach_variants, export_statement, import_products
+from app.core.search import rebuild_search_index
+from app.core.streaming import stream_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["import", "export", "reindex"])
+    parser.add_argument("path", nargs="?", help="file to import (default: stdin)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.path and args.path.endswith(".csv") else "ndjson")
+    
+    if args.command == "export":
+        for chunk in stream_rows(export_statement(), EXPORT_FIELDS, fmt, attach_variants):
+            sys.stdout.write(chunk)
+        return
+    
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    if args.command == "reindex":
+        try:
+            print(f"Reindexed {rebuild_search_index(db)} products")
+        finally:
+            db.close()
+        return
+    
+    try:
+        source = open(args.path, encoding="utf-8", newline="") if args.path else sys.stdin
+        with source:
+            result = import_products(db, source, fmt)
+    finally:
+        db.close()
+    json.dump(result.as_dict(), sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    if result.error_count:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
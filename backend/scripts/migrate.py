@@ -0,0 +1,230 @@
+"""
+Bring an existing database up to the current schema.
+
+Usage: python -m scripts.migrate
+
+Creates the new tables, then:
+- adds products.search_text, stock_shards and srcset, and fills in the
+  search documents (the SQLite FTS table and triggers as well);
+- on PostgreSQL, turns products.stock_quantity from numeric into a NOT
+  NULL integer and sets the server defaults of stock_quantity (0),
+  stock_shards (0) and is_active (true), which the bulk import relies on;
+- removes duplicate wishlist rows ahead of uq_wishlist_user_product;
+- copies every variant from the products.variants JSON column into
+  product_variants (its JSON `id` kept as legacy_id) and points
+  cart_items, order_items and stock_reservations at the new rows;
+- merges duplicate cart lines (quantities summed) ahead of
+  uq_cart_items_user_product_variant;
+- creates the indexes missing from tables that already existed.
+
+Safe to run more than once; the JSON column is left in place until the
+migration has been checked.
+"""
+import uuid
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from app.database import Base, SessionLocal, engine
+from app.core.search import rebuild_search_index
+from app.core.upsert import upsert
+from app.core.variants import variant_value
+from app.models.product import Product, ProductVariant, SQLITE_FTS_DDL
+
+# Columns added to products: name -> (PostgreSQL type, SQLite type)
+PRODUCT_COLUMNS = {
+    "search_text": ("text", "TEXT"),
+    "stock_shards": ("integer NOT NULL DEFAULT 0", "INTEGER NOT NULL DEFAULT 0"),
+    "srcset": ("json", "JSON"),
+}
+
+# Tables whose variant_id held the JSON id as a string
+VARIANT_REFERENCES = (
+    ("cart_items", "CASCADE"),
+    ("order_items", "SET NULL"),
+)
+
+
+def legacy_rows(product_id, variants) -> list:
+    """Turn a product's JSON variants (objects or plain names) into product_variants rows."""
+    rows = []
+    for position, item in enumerate(variants or []):
+        if not isinstance(item, dict):
+            item = {"name": str(item)}
+        name = str(item.get("name_en") or item.get("name") or item.get("value") or item.get("id") or "")
+        if not name:
+            continue
+        rows.append({
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "type": item.get("type") or "shade",
+            "value": variant_value({"value": item.get("value"), "name_en": name}),
+            "name_en": name,
+            "name_ar": item.get("name_ar") or name,
+            "sku": item.get("sku"),
+            "price": item.get("price"),
+            "stock_quantity": int(item.get("stock_quantity", item.get("stock", 0)) or 0),
+            "position": position,
+            "is_active": item.get("is_active", True),
+            "legacy_id": str(item["id"]) if item.get("id") is not None else name,
+        })
+    return rows
+
+
+def copy_variants(db: Session) -> int:
+    """Insert a row per JSON variant; variants already copied are left alone."""
+    rows = [
+        row
+        for product_id, variants in db.query(Product.id, Product.legacy_variants).filter(
+            Product.legacy_variants.isnot(None)
+        )
+        for row in legacy_rows(product_id, variants)
+    ]
+    if rows:
+        statement = upsert(db, ProductVariant).on_conflict_do_nothing(
+            index_elements=["product_id", "type", "value"]
+        )
+        db.execute(statement, rows)
+    return len(rows)
+
+
+def remap_references(db: Session, table: str) -> None:
+    """Replace JSON ids in `table`.variant_id with product_variants ids; unknown ids become NULL."""
+    db.execute(text(
+        f"UPDATE {table} SET variant_id = ("
+        "SELECT CAST(v.id AS VARCHAR) FROM product_variants v "
+        f"WHERE v.product_id = {table}.product_id AND v.legacy_id = {table}.variant_id"
+        ") WHERE variant_id IS NOT NULL "
+        "AND variant_id NOT IN (SELECT CAST(id AS VARCHAR) FROM product_variants)"
+    ))
+
+
+def column_types(db: Session, table: str) -> dict:
+    return {column["name"]: str(column["type"]).upper() for column in inspect(db.connection()).get_columns(table)}
+
+
+def migrate_products(db: Session, postgres: bool) -> None:
+    """Add the new product columns, and on PostgreSQL fix the stock column type and the server defaults."""
+    columns = column_types(db, "products")
+    for name, (postgres_type, sqlite_type) in PRODUCT_COLUMNS.items():
+        if name not in columns:
+            db.execute(text(f"ALTER TABLE products ADD COLUMN {name} {postgres_type if postgres else sqlite_type}"))
+    
+    if not postgres:
+        # SQLite column types and defaults can't be altered; its search runs on FTS5
+        for statement in SQLITE_FTS_DDL:
+            db.execute(text(statement))
+        return
+    
+    if columns["stock_quantity"] != "INTEGER":
+        db.execute(text("UPDATE products SET stock_quantity = 0 WHERE stock_quantity IS NULL"))
+        db.execute(text("ALTER TABLE products ALTER COLUMN stock_quantity TYPE integer USING stock_quantity::integer"))
+    db.execute(text(
+        "ALTER TABLE products "
+        "ALTER COLUMN stock_quantity SET DEFAULT 0, "
+        "ALTER COLUMN stock_quantity SET NOT NULL, "
+        "ALTER COLUMN stock_shards SET DEFAULT 0, "
+        "ALTER COLUMN is_active SET DEFAULT true"
+    ))
+
+
+def dedupe_wishlist(db: Session) -> None:
+    """Keep the oldest row of each (user, product) pair, so the unique index can be built."""
+    db.execute(text(
+        "DELETE FROM wishlist WHERE EXISTS ("
+        "SELECT 1 FROM wishlist w WHERE w.user_id = wishlist.user_id AND w.product_id = wishlist.product_id "
+        "AND (w.created_at < wishlist.created_at "
+        "OR (w.created_at = wishlist.created_at AND CAST(w.id AS VARCHAR) < CAST(wishlist.id AS VARCHAR))))"
+    ))
+
+
+def dedupe_cart_items(db: Session) -> None:
+    """
+    Merge cart lines for the same (user, product, variant), so the unique index can be built.
+    
+    The oldest line of each group takes the summed quantity and the others are deleted.
+    """
+    same_line = (
+        "c.user_id = cart_items.user_id AND c.product_id = cart_items.product_id "
+        "AND coalesce(CAST(c.variant_id AS VARCHAR), '') = coalesce(CAST(cart_items.variant_id AS VARCHAR), '')"
+    )
+    earlier = (
+        "(c.created_at < cart_items.created_at "
+        "OR (c.created_at = cart_items.created_at AND CAST(c.id AS VARCHAR) < CAST(cart_items.id AS VARCHAR)))"
+    )
+    db.execute(text(
+        f"UPDATE cart_items SET quantity = (SELECT SUM(c.quantity) FROM cart_items c WHERE {same_line}) "
+        f"WHERE NOT EXISTS (SELECT 1 FROM cart_items c WHERE {same_line} AND {earlier}) "
+        f"AND EXISTS (SELECT 1 FROM cart_items c WHERE {same_line} AND c.id <> cart_items.id)"
+    ))
+    db.execute(text(f"DELETE FROM cart_items WHERE EXISTS (SELECT 1 FROM cart_items c WHERE {same_line} AND {earlier})"))
+
+
+def migrate_variant_references(db: Session, postgres: bool) -> None:
+    """Point the variant_id columns at product_variants rows, as uuid foreign keys on PostgreSQL."""
+    if "variant_id" not in column_types(db, "stock_reservations"):
+        db.execute(text(
+            "ALTER TABLE stock_reservations ADD COLUMN variant_id "
+            + ("uuid REFERENCES product_variants(id) ON DELETE CASCADE" if postgres else "CHAR(32)")
+        ))
+    
+    for table, on_delete in VARIANT_REFERENCES:
+        if postgres and column_types(db, table).get("variant_id") == "UUID":
+            continue
+        if table == "cart_items":
+            # A cart line for a variant that no longer exists can't be bought
+            db.execute(text(
+                "DELETE FROM cart_items WHERE variant_id IS NOT NULL AND NOT EXISTS ("
+                "SELECT 1 FROM product_variants v WHERE v.product_id = cart_items.product_id "
+                "AND (v.legacy_id = cart_items.variant_id OR CAST(v.id AS VARCHAR) = cart_items.variant_id))"
+            ))
+        remap_references(db, table)
+        if postgres:
+            if table == "cart_items":
+                # The unique index casts variant_id, so it is rebuilt around the type change
+                db.execute(text("DROP INDEX IF EXISTS uq_cart_items_user_product_variant"))
+            db.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN variant_id TYPE uuid USING variant_id::uuid, "
+                f"ADD CONSTRAINT {table}_variant_id_fkey FOREIGN KEY (variant_id) "
+                f"REFERENCES product_variants(id) ON DELETE {on_delete}"
+            ))
+
+
+def create_indexes(db: Session, postgres: bool) -> None:
+    """create_all skips tables that exist, so build their new indexes here."""
+    # By name from the catalog: reflection leaves out SQLite's expression indexes
+    query = "SELECT indexname FROM pg_indexes" if postgres else "SELECT name FROM sqlite_master WHERE type = 'index'"
+    existing = set(db.execute(text(query)).scalars())
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.connection())
+
+
+def main():
+    # Also installs pg_trgm, which the search indexes need
+    Base.metadata.create_all(bind=engine)
+    postgres = engine.dialect.name == "postgresql"
+    
+    db = SessionLocal()
+    try:
+        migrate_products(db, postgres)
+        dedupe_wishlist(db)
+        db.commit()
+        print("product columns migrated")
+        print(f"reindexed {rebuild_search_index(db)} products")
+    
+        print(f"copied {copy_variants(db)} variants")
+        migrate_variant_references(db, postgres)
+        # After the remap, which can map two legacy ids onto one variant
+        dedupe_cart_items(db)
+        db.commit()
+        print("variant references migrated")
+    
+        create_indexes(db, postgres)
+        db.commit()
+        print("indexes created")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import uuid
+
+# Settings are read when the app is imported, so the test configuration goes first.
+# TEST_DATABASE_URL runs the suite against PostgreSQL; SQLite is used otherwise.
+TEST_DIR = tempfile.mkdtemp(prefix="cosmatic-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{TEST_DIR}/test.db")
+os.environ.update({
+    "PAYMENT_PROVIDER": "fake",
+    "PAYMENT_FAKE_ENABLED": "true",
+    "STRIPE_WEBHOOK_SECRET": "whsec_test",
+    "PASSWORD_HASH_WORKERS": "0",
+    "RATE_LIMIT_ENABLED": "false",
+    "MEDIA_ROOT": os.path.join(TEST_DIR, "media"),
+    "IMAGE_CACHE_DIR": os.path.join(TEST_DIR, "media", "derived"),
+    "PROFILE_DIR": os.path.join(TEST_DIR, "profiles"),
+})
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.sql import sqltypes
+from app.main import app
+from app.database import Base, SessionLocal, engine
+from app.core.cache import catalog_cache
+from app.core.deps import principal_cache, token_cache
+from app.core.security import create_access_token, get_password_hash
+from app.models.user import User
+
+# Routes compare UUID columns with path ids as strings, which PostgreSQL
+# drivers accept; let SQLite's UUID type bind them the same way.
+_uuid_bind_processor = sqltypes.Uuid.bind_processor
+
+
+def _string_uuid_bind_processor(self, dialect):
+    process = _uuid_bind_processor(self, dialect)
+    if process is None:
+        return None
+    
+    def bind(value):
+        if isinstance(value, str):
+            try:
+                value = uuid.UUID(value)
+            except ValueError:
+                return value
+        return process(value)
+    return bind
+
+
+if engine.dialect.name == "sqlite":
+    sqltypes.Uuid.bind_processor = _string_uuid_bind_processor
+
+# bcrypt is slow on purpose; every test user shares one hash
+PASSWORD = "password123"
+PASSWORD_HASH = get_password_hash(PASSWORD)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Empty every table and the in-process caches before each test."""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    catalog_cache.local.clear()
+    catalog_cache._generations.clear()
+    principal_cache.clear()
+    token_cache.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    # Not entered as a context manager, so the background workers stay stopped
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user():
+    """Create a user and return it with its bearer token headers."""
+    def make(email: str = None, is_admin: bool = False, is_active: bool = True):
+        session = SessionLocal()
+        try:
+            user = User(
+                email=email or f"{uuid.uuid4().hex[:10]}@example.com",
+                password_hash=PASSWORD_HASH,
+                full_name="Test User",
+                is_admin=is_admin,
+                is_active=is_active
+            )
+            session.add(user)
+            session.commit()
+            session.refresh(user)
+        finally:
+            session.close()
+        return user, {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    return make
+
+
+@pytest.fixture
+def user_headers(make_user):
+    return make_user()[1]
+
+
+@pytest.fixture
+def admin_headers(make_user):
+    return make_user(is_admin=True)[1]
+
+
+@pytest.fixture
+def make_product(client, admin_headers):
+    """Create a product through the admin API and return its JSON."""
+    def make(**fields):
+        body = {
+            "title_en": "Rose Lipstick",
+            "title_ar": "أحمر شفاه وردي",
+            "price": "10.00",
+            "slug": f"product-{uuid.uuid4().hex[:8]}",
+            "category": "lips",
+            "stock_quantity": 10,
+            **fields,
+        }
+        response = client.post("/api/products/", json=body, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def shipping_address():
+    return {
+        "full_name": "Test User",
+        "phone": "0500000000",
+        "address_line1": "1 Main Street",
+        "city": "Riyadh",
+        "country": "SA",
+    }
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.admission import AdmissionMiddleware, ConcurrencyLimiter, RateLimiter
+from app.core.security import create_access_token
+
+LIMITS = {"login": "2/minute", "register": "2/minute", "search": "2/minute", "catalog": "3/minute", "default": "2/minute"}
+
+
+class BrokenBuckets:
+    def take(self, key, capacity, rate):
+        raise ConnectionError("backend down")
+
+
+@pytest.fixture
+def limited():
+    """A client for a bare app behind admission control with tiny budgets."""
+    def build(backend=None):
+        app = FastAPI()
+    
+        @app.api_route("/{path:path}", methods=["GET", "POST"])
+        def echo(path: str):
+            return {"path": path}
+    
+        limiter = RateLimiter(LIMITS, max_clients=100, backend=backend)
+        app.add_middleware(AdmissionMiddleware, limiter=limiter, concurrency=ConcurrencyLimiter(8, 0.1))
+        return TestClient(app), limiter
+    return build
+
+
+def test_each_route_group_has_its_own_budget(limited):
+    client, limiter = limited()
+    
+    assert [client.post("/api/auth/login").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post("/api/auth/login")
+    assert int(response.headers["retry-after"]) >= 1
+    
+    # Catalog reads and unlimited paths don't draw from the login budget
+    assert [client.get("/api/products/").status_code for _ in range(4)] == [200, 200, 200, 429]
+    assert all(client.post("/api/payments/webhook").status_code == 200 for _ in range(5))
+    assert (limiter.allowed["login"], limiter.limited["login"]) == (2, 2)
+
+
+def test_signed_in_users_are_limited_separately(limited):
+    client, _ = limited()
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': 'alice'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': 'bob'})}"}
+    
+    assert [client.post("/api/cart/items", headers=alice).status_code for _ in range(3)] == [200, 200, 429]
+    assert client.post("/api/cart/items", headers=bob).status_code == 200
+    assert client.post("/api/cart/items").status_code == 200
+
+
+def test_a_failing_backend_falls_back_to_local_buckets(limited):
+    client, limiter = limited(BrokenBuckets())
+    
+    assert [client.post("/api/auth/login").status_code for _ in range(3)] == [200, 200, 429]
+    assert limiter.backend_errors == 3
+
+
+def test_requests_without_a_slot_are_shed():
+    limiter = ConcurrencyLimiter(max_concurrent=1, queue_timeout=0.01)
+    
+    async def scenario():
+        assert await limiter.acquire()
+        shed = not await limiter.acquire()
+        limiter.release()
+        return shed, await limiter.acquire()
+    
+    assert asyncio.run(scenario()) == (True, True)
+    assert limiter.stats()["shed"] == 1
+    assert limiter.stats()["in_flight"] == 1
@@ -0,0 +1,72 @@
+import sys
+import threading
+import pytest
+from app.core.cache import CatalogCache, LocalBackend, TTLCache
+
+
+@pytest.fixture(params=["local", "shared"])
+def cache(request):
+    backend = LocalBackend() if request.param == "shared" else None
+    return CatalogCache(maxsize=16, ttl=60, local_ttl=5, backend=backend)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    lru = TTLCache(maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_shared_entries_fill_the_local_tier():
+    backend = LocalBackend()
+    writer = CatalogCache(maxsize=16, ttl=60, local_ttl=5, backend=backend)
+    reader = CatalogCache(maxsize=16, ttl=60, local_ttl=5, backend=backend)
+    
+    writer.set("product:1", {"id": 1})
+    assert reader.get("product:1") == {"id": 1}
+    assert reader.stats()["shared"]["hits"] == 1
+    assert reader.local.get("product:1") == {"id": 1}
+    
+    writer.delete("product:1")
+    reader.local.clear()
+    assert reader.get("product:1") is None
+
+
+def test_invalidating_a_product_retires_its_listings(cache):
+    lips = cache.listing_key("list", "lips", 1)
+    eyes = cache.listing_key("list", "eyes", 1)
+    everything = cache.listing_key("list", None, 1)
+    cache.set("product:1", {"id": 1})
+    cache.set("product:rose", {"id": 1})
+    
+    cache.invalidate_product(1, "rose", "lips")
+    
+    assert cache.get("product:1") is None and cache.get("product:rose") is None
+    assert cache.listing_key("list", "lips", 1) != lips
+    assert cache.listing_key("list", None, 1) != everything
+    assert cache.listing_key("list", "eyes", 1) == eyes
+
+
+def test_concurrent_bumps_are_all_counted(cache):
+    def bump():
+        for _ in range(500):
+            cache.bump_generation("lips")
+    
+    # Switch threads as often as possible so unguarded increments collide
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    
+    assert cache.generation("lips") == 4000
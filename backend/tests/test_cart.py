@@ -0,0 +1,64 @@
+def cart_lines(client, headers) -> dict:
+    response = client.get("/api/cart/", headers=headers)
+    assert response.status_code == 200, response.text
+    return {(item["product_id"], item["variant_id"]): item["quantity"] for item in response.json()["items"]}
+
+
+def add(client, headers, product_id, quantity=1, variant_id=None):
+    return client.post(
+        "/api/cart/items",
+        json={"product_id": product_id, "variant_id": variant_id, "quantity": quantity},
+        headers=headers
+    )
+
+
+def test_adding_a_line_again_adds_to_its_quantity(client, make_product, user_headers):
+    product = make_product(variants=[{"name_en": "Berry", "name_ar": "توتي"}])
+    berry = product["variants"][0]["id"]
+    
+    for quantity, variant_id in ((1, None), (2, None), (3, berry)):
+        assert add(client, user_headers, product["id"], quantity, variant_id).status_code == 200
+    
+    assert cart_lines(client, user_headers) == {(product["id"], None): 3, (product["id"], berry): 3}
+    assert add(client, user_headers, product["id"], 0).status_code == 422
+
+
+def test_batch_folds_operations_per_line(client, make_product, user_headers):
+    lipstick, gloss = make_product(), make_product()
+    add(client, user_headers, gloss["id"], 2)
+    
+    response = client.post("/api/cart/items/batch", json={"operations": [
+        {"op": "add", "product_id": lipstick["id"], "quantity": 2},
+        {"op": "add", "product_id": lipstick["id"], "quantity": 3},
+        {"op": "set", "product_id": gloss["id"], "quantity": 4},
+        {"op": "add", "product_id": gloss["id"], "quantity": 1},
+    ]}, headers=user_headers)
+    assert response.status_code == 200, response.text
+    assert cart_lines(client, user_headers) == {(lipstick["id"], None): 5, (gloss["id"], None): 5}
+    
+    response = client.post("/api/cart/items/batch", json={"operations": [
+        {"op": "remove", "product_id": gloss["id"]},
+    ]}, headers=user_headers)
+    assert response.json()["item_count"] == 1
+
+
+def test_inactive_products_and_variants_stay_out_of_the_cart(client, make_product, user_headers, admin_headers):
+    hidden = make_product(is_active=False)
+    product = make_product(variants=[{"name_en": "Berry", "name_ar": "توتي", "is_active": False}])
+    berry = product["variants"][0]["id"]
+    
+    assert add(client, user_headers, hidden["id"]).status_code == 404
+    assert add(client, user_headers, product["id"], variant_id=berry).status_code == 404
+    for operation in ({"product_id": hidden["id"]}, {"product_id": product["id"], "variant_id": berry}):
+        response = client.post("/api/cart/items/batch", json={"operations": [{"op": "add", **operation}]}, headers=user_headers)
+        assert response.status_code == 404
+    assert cart_lines(client, user_headers) == {}
+    
+    # Lines added before a product was retired can still be removed
+    assert add(client, user_headers, product["id"]).status_code == 200
+    client.put(f"/api/products/{product['id']}", json={"is_active": False}, headers=admin_headers)
+    response = client.post("/api/cart/items/batch", json={"operations": [
+        {"op": "remove", "product_id": product["id"]},
+    ]}, headers=user_headers)
+    assert response.status_code == 200, response.text
+    assert cart_lines(client, user_headers) == {}
@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from app.core.inventory import release_expired_reservations
+from app.models.inventory import StockReservation, StockShard
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+
+
+def checkout(client, headers, product_id, quantity, shipping_address):
+    response = client.post("/api/cart/items", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+    assert response.status_code == 200, response.text
+    return client.post("/api/orders/checkout", json={"shipping_address": shipping_address}, headers=headers)
+
+
+def stock_of(db, product_id) -> int:
+    db.expire_all()
+    return db.get(Product, uuid.UUID(product_id)).stock_quantity
+
+
+def test_checkout_reserves_stock_until_the_reservation_expires(client, db, make_product, user_headers, shipping_address):
+    product = make_product(stock_quantity=5)
+    
+    response = checkout(client, user_headers, product["id"], 3, shipping_address)
+    assert response.status_code == 200, response.text
+    assert stock_of(db, product["id"]) == 2
+    
+    # Reserved stock is held, so a second order for more than is left is refused
+    response = checkout(client, user_headers, product["id"], 3, shipping_address)
+    assert response.status_code == 409
+    assert stock_of(db, product["id"]) == 2
+    
+    db.query(StockReservation).update({"expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)})
+    db.commit()
+    assert release_expired_reservations() == 1
+    assert stock_of(db, product["id"]) == 5
+    assert db.query(Order.status).scalar() == OrderStatus.CANCELLED
+
+
+def test_sharded_stock_is_synced_without_touching_settled_rows(client, db, make_product, admin_headers, user_headers, shipping_address):
+    product = make_product(stock_quantity=8)
+    response = client.put(f"/api/products/{product['id']}/stock-shards", params={"count": 4}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert checkout(client, user_headers, product["id"], 1, shipping_address).status_code == 200
+    
+    release_expired_reservations()
+    assert stock_of(db, product["id"]) == 7
+    assert sum(shard.quantity for shard in db.query(StockShard)) == 7
+    
+    # A sweep with nothing to change leaves the row, and its updated_at, alone
+    settled = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    db.query(Product).update({"updated_at": settled})
+    db.commit()
+    release_expired_reservations()
+    db.expire_all()
+    assert db.query(Product.updated_at).scalar().replace(tzinfo=timezone.utc) == settled
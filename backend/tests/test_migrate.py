@@ -0,0 +1,58 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from app.models.cart import CartItem
+from app.models.product import Product
+from app.models.wishlist import Wishlist
+from scripts import migrate
+
+
+def test_migration_merges_duplicate_cart_lines_and_wishlist_rows(db, make_user, make_product):
+    user, _ = make_user()
+    lipstick = make_product()
+    gloss = make_product(variants=[{"name_en": "Berry", "name_ar": "توتي"}])
+    berry = uuid.UUID(gloss["variants"][0]["id"])
+    lipstick_id, gloss_id = uuid.UUID(lipstick["id"]), uuid.UUID(gloss["id"])
+    
+    # Databases from before the unique indexes can hold repeated lines
+    db.execute(text("DROP INDEX uq_cart_items_user_product_variant"))
+    db.execute(text("DROP INDEX uq_wishlist_user_product"))
+    started = datetime.now(timezone.utc)
+    db.add_all([
+        CartItem(user_id=user.id, product_id=lipstick_id, quantity=1, created_at=started),
+        CartItem(user_id=user.id, product_id=lipstick_id, quantity=2, created_at=started + timedelta(seconds=1)),
+        CartItem(user_id=user.id, product_id=lipstick_id, quantity=4, created_at=started + timedelta(seconds=2)),
+        CartItem(user_id=user.id, product_id=gloss_id, variant_id=berry, quantity=1, created_at=started),
+        CartItem(user_id=user.id, product_id=gloss_id, variant_id=berry, quantity=5, created_at=started),
+        CartItem(user_id=user.id, product_id=gloss_id, quantity=3, created_at=started),
+        Wishlist(user_id=user.id, product_id=lipstick_id),
+        Wishlist(user_id=user.id, product_id=lipstick_id),
+    ])
+    db.commit()
+    first_line = db.query(CartItem.id).filter(CartItem.quantity == 1, CartItem.variant_id.is_(None)).scalar()
+    
+    migrate.main()
+    db.expire_all()
+    
+    lines = {(item.product_id, item.variant_id): item for item in db.query(CartItem)}
+    assert {key: item.quantity for key, item in lines.items()} == {
+        (lipstick_id, None): 7,
+        (gloss_id, berry): 6,
+        (gloss_id, None): 3,
+    }
+    assert lines[lipstick_id, None].id == first_line
+    assert db.query(Wishlist).count() == 1
+    indexes = {row[0] for row in db.execute(text(
+        "SELECT indexname FROM pg_indexes" if db.get_bind().dialect.name == "postgresql"
+        else "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ))}
+    assert {"uq_cart_items_user_product_variant", "uq_wishlist_user_product"} <= indexes
+
+
+def test_migration_is_repeatable(db, make_product):
+    make_product(title_en="Rose Lipstick")
+    
+    migrate.main()
+    migrate.main()
+    
+    assert db.query(Product.search_text).scalar().startswith("rose lipstick")
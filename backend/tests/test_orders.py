@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+from app.models.order import Order
+
+
+def add_orders(db, user, count: int) -> list:
+    """Insert `count` orders a minute apart; returns their numbers, newest first."""
+    started = datetime.now(timezone.utc)
+    orders = [
+        Order(
+            user_id=user.id,
+            order_number=f"ORD-{index:04d}",
+            total_amount=10,
+            shipping_address={},
+            created_at=started + timedelta(minutes=index)
+        )
+        for index in range(count)
+    ]
+    db.add_all(orders)
+    db.commit()
+    return [order.order_number for order in reversed(orders)]
+
+
+def order_numbers(response) -> list:
+    assert response.status_code == 200, response.text
+    return [order["order_number"] for order in response.json()]
+
+
+def test_order_history_is_whole_without_paging_params(client, db, make_user):
+    user, headers = make_user()
+    numbers = add_orders(db, user, 25)
+    
+    assert order_numbers(client.get("/api/orders/", headers=headers)) == numbers
+    assert order_numbers(client.get("/api/orders/", params={"summary": True}, headers=headers)) == numbers
+    assert order_numbers(client.get("/api/orders/", params={"page": 2}, headers=headers)) == numbers[20:]
+    assert order_numbers(client.get("/api/orders/", params={"per_page": 10}, headers=headers)) == numbers[:10]
+
+
+def test_order_history_pages_by_cursor(client, db, make_user):
+    user, headers = make_user()
+    numbers = add_orders(db, user, 5)
+    
+    seen, cursor = [], ""
+    while cursor is not None:
+        response = client.get("/api/orders/", params={"cursor": cursor, "per_page": 2}, headers=headers)
+        seen += order_numbers(response)
+        cursor = response.headers.get("X-Next-Cursor")
+    assert seen == numbers
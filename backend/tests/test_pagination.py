@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.pagination import estimate_count
+from app.database import engine
+from app.models.product import Product
+
+
+def walk(client, params) -> list:
+    """Follow next_cursor from the first page; returns the slugs in order."""
+    slugs, cursor = [], ""
+    while cursor is not None:
+        response = client.get("/api/products/", params={**params, "cursor": cursor, "per_page": 2})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["page"] is None
+        slugs += [item["slug"] for item in body["items"]]
+        cursor = body["next_cursor"]
+    return slugs
+
+
+def test_cursor_pages_cover_every_product_once(client, make_product):
+    # Equal prices make the id tiebreaker decide the order within a price
+    for slug, price in (("a", "5.00"), ("b", "10.00"), ("c", "10.00"), ("d", "10.00"), ("e", "20.00")):
+        make_product(slug=slug, price=price)
+    
+    ascending = walk(client, {"sort": "price_asc"})
+    assert sorted(ascending) == ["a", "b", "c", "d", "e"]
+    assert ascending[0] == "a" and ascending[-1] == "e"
+    assert walk(client, {"sort": "price_desc"}) == ascending[::-1]
+    assert sorted(walk(client, {})) == ["a", "b", "c", "d", "e"]
+
+
+def test_cursors_are_validated(client, make_product):
+    make_product()
+    
+    assert client.get("/api/products/", params={"cursor": "not-a-cursor"}).status_code == 400
+    # A cursor from one sort order cannot continue another
+    make_product()
+    cursor = client.get("/api/products/", params={"cursor": "", "per_page": 1, "sort": "price_asc"}).json()["next_cursor"]
+    assert client.get("/api/products/", params={"cursor": cursor}).status_code == 400
+
+
+@pytest.mark.parametrize("count", ["exact", "estimate", "none"])
+def test_count_modes(client, make_product, count):
+    make_product(category="lips")
+    make_product(category="eyes")
+    
+    response = client.get("/api/products/", params={"count": count, "category": "lips", "search": "rose"})
+    assert response.status_code == 200, response.text
+    total = response.json()["total"]
+    if count == "none":
+        assert total is None
+    elif count == "exact" or engine.dialect.name != "postgresql":
+        assert total == 1
+    else:
+        assert isinstance(total, int)
+
+
+def test_estimate_binds_parameters_through_the_session(monkeypatch):
+    # Compiling needs no server, so the Postgres path can be checked offline
+    session = Session(create_engine("postgresql+psycopg2://localhost/cosmatic"))
+    executed = {}
+    
+    class Result:
+        def scalar(self):
+            return [{"Plan": {"Plan Rows": 42}}]
+    
+    def execute(statement, params):
+        executed.update(sql=str(statement), params=params)
+        return Result()
+    
+    monkeypatch.setattr(session, "execute", execute)
+    query = session.query(Product).filter(Product.category.in_(["lips", "eyes"]), Product.brand == "Rose")
+    
+    assert estimate_count(query) == 42
+    assert executed["sql"].startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "%(" not in executed["sql"]
+    assert sorted(executed["params"].values()) == ["Rose", "eyes", "lips"]
+    assert all(f":{name}" in executed["sql"] for name in executed["params"])
@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import json
+import time
+import pytest
+from app.config import settings
+from app.core import payments
+from app.core.outbox import outbox_worker
+from app.core.payments import PaymentNotConfigured, StripeProvider
+from app.models.outbox import OutboxEvent, OutboxStatus
+
+
+@pytest.fixture
+def place_order(client, make_product, user_headers, shipping_address):
+    """Check out a one-line cart and return the order JSON."""
+    def place(quantity: int = 1):
+        product = make_product(stock_quantity=5)
+        response = client.post("/api/cart/items", json={"product_id": product["id"], "quantity": quantity}, headers=user_headers)
+        assert response.status_code == 200, response.text
+        response = client.post("/api/orders/checkout", json={"shipping_address": shipping_address}, headers=user_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return place
+
+
+def get_order(client, headers, order_id) -> dict:
+    response = client.get(f"/api/orders/{order_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def post_webhook(client, payload: bytes, signature: str):
+    return client.post(
+        "/api/payments/webhook",
+        content=payload,
+        headers={"Stripe-Signature": signature, "Content-Type": "application/json"}
+    )
+
+
+def stripe_signature(payload: bytes, secret: str) -> str:
+    timestamp = int(time.time())
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def test_checkout_is_paid_by_a_signed_webhook(client, db, place_order, user_headers):
+    order = place_order()
+    assert order["status"] == "pending"
+    
+    outbox_worker.run_once()
+    payment_id = get_order(client, user_headers, order["id"])["payment_id"]
+    assert payment_id.startswith("pi_fake_")
+    
+    payload, signature = payments.payment_provider.event("payment_intent.succeeded", payment_id)
+    assert post_webhook(client, payload, signature).json() == {"received": True}
+    # Providers redeliver; the same event is stored once
+    assert post_webhook(client, payload, signature).status_code == 200
+    assert db.query(OutboxEvent).filter(OutboxEvent.topic == "payment.event").count() == 1
+    
+    outbox_worker.run_once()
+    assert get_order(client, user_headers, order["id"])["status"] == "paid"
+
+
+def test_webhook_with_a_bad_signature_is_rejected(client, db):
+    payload, signature = payments.payment_provider.event("payment_intent.succeeded", "pi_fake_forged")
+    forged = signature.rsplit("=", 1)[0] + "=" + "0" * 64
+    
+    assert post_webhook(client, payload, forged).status_code == 400
+    assert db.query(OutboxEvent).count() == 0
+
+
+def test_stripe_webhook_is_refused_without_a_secret(client, db, monkeypatch):
+    monkeypatch.setattr("app.api.payments.payment_provider", StripeProvider())
+    monkeypatch.setattr(settings, "STRIPE_WEBHOOK_SECRET", "")
+    payload = json.dumps({
+        "id": "evt_forged",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"id": "pi_forged", "object": "payment_intent"}},
+    }).encode()
+    
+    # Signed with the empty key, which would verify if the secret were used as is
+    response = post_webhook(client, payload, stripe_signature(payload, ""))
+    assert response.status_code == 503
+    assert db.query(OutboxEvent).count() == 0
+
+
+def test_stripe_payment_fails_at_once_without_a_key(client, db, place_order, monkeypatch):
+    monkeypatch.setattr(payments, "payment_provider", StripeProvider())
+    monkeypatch.setattr(settings, "STRIPE_SECRET_KEY", "")
+    place_order()
+    
+    assert outbox_worker.run_once() == 1
+    event = db.query(OutboxEvent).filter(OutboxEvent.topic == "order.created").one()
+    assert event.status == OutboxStatus.FAILED
+    assert event.attempts == 1
+    assert event.last_error.startswith("PaymentNotConfigured")
+
+
+def test_stripe_client_bounds_timeouts_and_retries(monkeypatch):
+    import stripe
+    created = {}
+    
+    def client(api_key, **options):
+        created.update(options, api_key=api_key)
+        return object()
+    
+    monkeypatch.setattr(stripe, "StripeClient", client)
+    monkeypatch.setattr(settings, "STRIPE_SECRET_KEY", "sk_test_key")
+    StripeProvider().client()
+    
+    assert created["api_key"] == "sk_test_key"
+    assert created["max_network_retries"] == settings.STRIPE_MAX_NETWORK_RETRIES
+    assert created["http_client"]._timeout == settings.STRIPE_TIMEOUT_SECONDS
+    
+    monkeypatch.setattr(settings, "STRIPE_SECRET_KEY", "")
+    with pytest.raises(PaymentNotConfigured):
+        StripeProvider().client()
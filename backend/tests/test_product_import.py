@@ -0,0 +1,70 @@
+import json
+
+
+def import_rows(client, headers, rows, fmt="ndjson"):
+    body = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) if fmt == "ndjson" else rows
+    response = client.post(
+        "/api/products/import",
+        params={"format": fmt},
+        files={"file": (f"products.{fmt}", body.encode())},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def product_by_slug(client, slug) -> dict:
+    items = client.get("/api/products/", params={"per_page": 100}).json()["items"]
+    return next(item for item in items if item["slug"] == slug)
+
+
+ROW = {"slug": "velvet", "title_en": "Velvet Lipstick", "title_ar": "أحمر شفاه مخملي", "price": "15.00"}
+
+
+def test_import_fills_in_variant_defaults(client, admin_headers):
+    result = import_rows(client, admin_headers, [
+        {**ROW, "stock_quantity": 4, "variants": [{"name_en": "Berry", "name_ar": "توتي", "stock_quantity": 2}]},
+    ])
+    assert result["errors"] == []
+    assert result["upserted"] == 1
+    
+    variants = product_by_slug(client, "velvet")["variants"]
+    assert [(variant["type"], variant["value"], variant["stock_quantity"]) for variant in variants] == [("shade", "berry", 2)]
+
+
+def test_reimport_keeps_fields_and_stock_missing_from_the_row(client, admin_headers):
+    import_rows(client, admin_headers, [
+        {**ROW, "description_en": "Soft matte", "stock_quantity": 4,
+         "variants": [{"name_en": "Berry", "name_ar": "توتي", "stock_quantity": 2}]},
+    ])
+    result = import_rows(client, admin_headers, [
+        {**ROW, "price": "17.00", "variants": [{"name_en": "Berry", "name_ar": "توت"}]},
+    ])
+    assert result["errors"] == []
+    
+    product = product_by_slug(client, "velvet")
+    assert product["price"] == "17.00"
+    assert product["description_en"] == "Soft matte"
+    assert product["stock_quantity"] == 4
+    assert [(variant["name_ar"], variant["stock_quantity"]) for variant in product["variants"]] == [("توت", 2)]
+
+
+def test_bad_rows_are_reported_and_skipped(client, admin_headers):
+    result = import_rows(client, admin_headers, [
+        ROW,
+        {"slug": "no-price", "title_en": "No Price", "title_ar": "بدون سعر"},
+        {**ROW, "slug": "bad-variant", "variants": [{"type": "shade"}]},
+    ])
+    assert result["rows"] == 3
+    assert result["upserted"] == 1
+    assert [(error["line"], error["slug"]) for error in result["errors"]] == [(2, "no-price"), (3, "bad-variant")]
+
+
+def test_csv_export_round_trips(client, admin_headers, make_product):
+    make_product(slug="gloss", title_en="Gloss", variants=[{"type": "size", "name_en": "50ml", "name_ar": "٥٠ مل"}])
+    exported = client.get("/api/products/export", params={"format": "csv"}, headers=admin_headers).text
+    
+    result = import_rows(client, admin_headers, exported, fmt="csv")
+    assert result["errors"] == []
+    assert result["upserted"] == 1
+    assert [variant["value"] for variant in product_by_slug(client, "gloss")["variants"]] == ["50ml"]
@@ -0,0 +1,29 @@
+from fastapi.routing import APIRoute
+from app.core.profiling import profiled
+from app.main import app
+
+
+def profiled_layers(endpoint) -> int:
+    """How many `profiled` wrappers an endpoint sits under."""
+    wrapper_code = profiled(lambda: None).__code__
+    layers = 0
+    while endpoint is not None:
+        layers += getattr(endpoint, "__code__", None) is wrapper_code
+        endpoint = getattr(endpoint, "__wrapped__", None)
+    return layers
+
+
+def test_routes_are_profiled_once():
+    routes = [route for route in app.routes if isinstance(route, APIRoute)]
+    layers = {route.path: profiled_layers(route.endpoint) for route in routes}
+    assert 1 in layers.values()
+    assert max(layers.values()) == 1, layers
+
+
+def test_profiled_is_idempotent():
+    def endpoint():
+        return "ok"
+    
+    wrapped = profiled(endpoint)
+    assert profiled(wrapped) is wrapped
+    assert wrapped() == "ok"
@@ -0,0 +1,33 @@
+from app.core.text import build_search_document, normalize_text, tokenize
+
+
+def search(client, term):
+    response = client.get("/api/products/", params={"search": term})
+    assert response.status_code == 200, response.text
+    return [item["slug"] for item in response.json()["items"]]
+
+
+def test_normalize_text_folds_arabic_variants():
+    assert normalize_text("أَحْمَرُ  شِفَاه") == "احمر شفاه"
+    assert normalize_text("مسكرة") == normalize_text("مسكره")
+    assert tokenize("Rose-Lipstick, matte!") == ["rose", "lipstick", "matte"]
+    assert build_search_document("Rose", None, "وردي") == "rose وردي"
+
+
+def test_search_matches_english_prefixes_and_arabic_without_diacritics(client, make_product):
+    rose = make_product(slug="rose", title_en="Rose Lipstick", title_ar="أَحْمَرُ شِفَاه وردي")
+    make_product(slug="mascara", title_en="Volume Mascara", title_ar="مسكرة")
+    
+    assert search(client, "lipst") == [rose["slug"]]
+    assert search(client, "احمر") == [rose["slug"]]
+    assert search(client, "مسكره") == ["mascara"]
+
+
+def test_search_follows_product_updates(client, make_product, admin_headers):
+    product = make_product(slug="gloss", title_en="Lip Gloss")
+    
+    response = client.put(f"/api/products/{product['id']}", json={"title_en": "Shine Balm"}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    
+    assert search(client, "balm") == ["gloss"]
+    assert search(client, "gloss") == []
@@ -0,0 +1,54 @@
+def variants_of(client, product_id) -> dict:
+    response = client.get(f"/api/products/{product_id}")
+    assert response.status_code == 200, response.text
+    return {(variant["type"], variant["value"]): variant for variant in response.json()["variants"]}
+
+
+def put_variants(client, headers, product_id, variants):
+    return client.put(f"/api/products/{product_id}", json={"variants": variants}, headers=headers)
+
+
+def test_update_fills_in_variant_defaults(client, make_product, admin_headers):
+    product = make_product()
+    
+    # `type` defaults to "shade" and `value` to the lowercased English name
+    response = put_variants(client, admin_headers, product["id"], [{"name_en": "Berry", "name_ar": "توتي"}])
+    assert response.status_code == 200, response.text
+    
+    variants = variants_of(client, product["id"])
+    assert list(variants) == [("shade", "berry")]
+    assert variants["shade", "berry"]["stock_quantity"] == 0
+
+
+def test_update_keeps_ids_and_stock_unless_stock_is_sent(client, make_product, admin_headers):
+    product = make_product(variants=[
+        {"type": "shade", "name_en": "Berry", "name_ar": "توتي", "stock_quantity": 7},
+        {"type": "size", "name_en": "50ml", "name_ar": "٥٠ مل", "stock_quantity": 3},
+    ])
+    before = variants_of(client, product["id"])
+    
+    response = put_variants(client, admin_headers, product["id"], [
+        {"type": "shade", "name_en": "Berry", "name_ar": "توت", "price": "12.50"},
+        {"type": "shade", "name_en": "Nude", "name_ar": "نود"},
+    ])
+    assert response.status_code == 200, response.text
+    after = variants_of(client, product["id"])
+    
+    assert set(after) == {("shade", "berry"), ("shade", "nude")}
+    assert after["shade", "berry"]["id"] == before["shade", "berry"]["id"]
+    assert after["shade", "berry"]["stock_quantity"] == 7
+    assert after["shade", "berry"]["name_ar"] == "توت"
+    
+    response = put_variants(client, admin_headers, product["id"], [
+        {"name_en": "Berry", "name_ar": "توت", "stock_quantity": 2},
+    ])
+    assert response.status_code == 200, response.text
+    assert variants_of(client, product["id"])["shade", "berry"]["stock_quantity"] == 2
+
+
+def test_variant_filters(client, make_product):
+    berry = make_product(variants=[{"name_en": "Berry", "name_ar": "توتي"}])
+    make_product(variants=[{"name_en": "Nude", "name_ar": "نود"}])
+    
+    response = client.get("/api/products/", params={"shade": "BERRY"})
+    assert [item["id"] for item in response.json()["items"]] == [berry["id"]]